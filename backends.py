@@ -0,0 +1,129 @@
+import os
+
+DEFAULT_MODEL = "default"
+
+
+class DiamondBackend:
+    """The Diamond server's own protocol: POST {"question"} to /ask, read answer/error/metadata."""
+
+    name = "diamond"
+    health_path = "/health"
+
+    def headers(self):
+        return {}
+
+    def request(self, question, stream, history=None):
+        """Return the (path, JSON payload) that asks `question`.
+
+        `history` is a list of earlier chat messages ({"role", "content"}),
+        oldest first; it is only sent when there is some.
+        """
+        payload = {"question": question}
+        if history:
+            payload["history"] = history
+        if stream:
+            payload["stream"] = True
+        return "/ask", payload
+
+    def decode(self, data):
+        return data
+
+    def decode_event(self, event):
+        """Map one streamed event onto {token, metadata, error, done}."""
+        return {
+            "token": event.get("token", event.get("answer", "")),
+            "metadata": event.get("metadata"),
+            "error": event.get("error"),
+            "done": event.get("done", False),
+        }
+
+
+class OpenAIBackend:
+    """OpenAI-compatible /v1/chat/completions, as served by vLLM, llama.cpp and others."""
+
+    name = "openai"
+    health_path = "/v1/models"
+
+    def __init__(self, model=DEFAULT_MODEL, api_key=None, system_prompt=None, max_tokens=None):
+        self.model = model
+        self.api_key = api_key
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+
+    def headers(self):
+        if self.api_key:
+            return {"Authorization": f"Bearer {self.api_key}"}
+        return {}
+
+    def request(self, question, stream, history=None):
+        history = list(history or [])
+        # Many chat templates accept a single, leading system message only.
+        system = [self.system_prompt] if self.system_prompt else []
+        while history and history[0]["role"] == "system":
+            system.append(history.pop(0)["content"])
+        messages = []
+        if system:
+            messages.append({"role": "system", "content": "\n\n".join(system)})
+        messages.extend(history)
+        messages.append({"role": "user", "content": question})
+        payload = {"model": self.model, "messages": messages, "stream": stream}
+        if self.max_tokens:
+            payload["max_tokens"] = self.max_tokens
+        return "/v1/chat/completions", payload
+
+    def decode(self, data):
+        if "error" in data:
+            return {"error": error_message(data["error"])}
+        choice = (data.get("choices") or [{}])[0]
+        return {
+            "answer": (choice.get("message") or {}).get("content") or "",
+            "metadata": {
+                "model": data.get("model"),
+                "finish_reason": choice.get("finish_reason"),
+                "usage": data.get("usage"),
+            },
+        }
+
+    def decode_event(self, event):
+        if "error" in event:
+            return {"token": "", "metadata": None, "error": error_message(event["error"]), "done": True}
+        choice = (event.get("choices") or [{}])[0]
+        metadata = None
+        if choice.get("finish_reason") or event.get("usage"):
+            metadata = {
+                "model": event.get("model"),
+                "finish_reason": choice.get("finish_reason"),
+                "usage": event.get("usage"),
+            }
+        return {
+            "token": (choice.get("delta") or {}).get("content") or "",
+            "metadata": metadata,
+            "error": None,
+            "done": False,
+        }
+
+
+def error_message(error):
+    if isinstance(error, dict):
+        return error.get("message", str(error))
+    return error
+
+
+BACKENDS = {"diamond": DiamondBackend, "openai": OpenAIBackend}
+
+
+def backend_from_env():
+    """Pick the backend named by LLM_BACKEND (default: diamond)."""
+    env = os.environ
+    name = env.get("LLM_BACKEND", "diamond").lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND {name!r}; expected one of {', '.join(BACKENDS)}")
+    if name == "openai":
+        max_tokens = env.get("LLM_MAX_TOKENS")
+        return OpenAIBackend(
+            model=env.get("LLM_MODEL", DEFAULT_MODEL),
+            api_key=env.get("LLM_API_KEY"),
+            system_prompt=env.get("LLM_SYSTEM_PROMPT"),
+            max_tokens=int(max_tokens) if max_tokens else None,
+        )
+    return DiamondBackend()
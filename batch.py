@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import requests
+
+from history_store import decode_line, read_jsonl
+from transport import Transport
+
+
+def record_id(record, line_number):
+    return str(record.get("request_id", record.get("id", f"line-{line_number}")))
+
+
+def record_question(record):
+    if "question" in record:
+        return record["question"]
+    if "prompt" in record:
+        return record["prompt"]
+    return "\n\n".join(part for part in (record.get("title"), record.get("body")) if part)
+
+
+def read_records(path):
+    """Yield (id, question) pairs from a JSONL file one line at a time."""
+    with open(path, "rb") as f:
+        for line_number, line in enumerate(f, 1):
+            record = decode_line(line)
+            if record is None:
+                continue
+            question = record_question(record)
+            if question:
+                yield record_id(record, line_number), question
+
+
+def completed_ids(path):
+    return {entry["id"] for entry in read_jsonl(path) if "id" in entry and "error" not in entry}
+
+
+def open_output(path):
+    # A run killed mid-write can leave a partial last line; start on a fresh one.
+    needs_newline = False
+    if os.path.exists(path) and os.path.getsize(path):
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    f = open(path, "a", encoding="utf-8")
+    if needs_newline:
+        f.write("\n")
+    return f
+
+
+def ask(transport, request_id, question):
+    started_at = datetime.now().isoformat()
+    start = time.perf_counter()
+    result = {"id": request_id, "question": question, "started_at": started_at}
+    try:
+        data = transport.ask(question)
+        if "error" in data:
+            result["error"] = data["error"]
+        else:
+            result["answer"] = data.get("answer", "")
+            result["metadata"] = data.get("metadata")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        result["error"] = str(e)
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def run(args):
+    transport = Transport.from_env(base_url=args.base_url, read_timeout=args.timeout, pool_size=args.parallelism)
+
+    done = set() if args.fresh else completed_ids(args.output)
+    output = open(args.output, "w", encoding="utf-8") if args.fresh else open_output(args.output)
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+    start = time.perf_counter()
+
+    executor = ThreadPoolExecutor(max_workers=args.parallelism)
+    in_flight = set()
+    try:
+        for request_id, question in read_records(args.input):
+            if request_id in done:
+                counts["skipped"] += 1
+                continue
+            # Keep at most two rounds of work queued so the input is never read ahead in bulk.
+            while len(in_flight) >= args.parallelism * 2:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                write_results(output, finished, counts)
+            in_flight.add(executor.submit(ask, transport, request_id, question))
+        while in_flight:
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            write_results(output, finished, counts)
+    except KeyboardInterrupt:
+        # Keep what is already answered; everything else is asked again on the next run.
+        write_results(output, [future for future in in_flight if future.done()], counts)
+        output.close()
+        transport.close()
+        print("Interrupted; rerun the same command to continue.", file=sys.stderr)
+        sys.stderr.flush()
+        # Workers can be waiting on the server for up to --timeout, and a normal
+        # exit (SystemExit included) joins them first.
+        os._exit(130)
+    executor.shutdown()
+
+    output.close()
+    transport.close()
+    elapsed = time.perf_counter() - start
+    answered = counts["ok"] + counts["error"]
+    print(
+        f"{counts['ok']} answered, {counts['error']} failed, {counts['skipped']} skipped "
+        f"in {elapsed:.1f}s ({answered / elapsed if elapsed else 0:.2f} req/s)",
+        file=sys.stderr,
+    )
+    if answered:
+        print(transport.metrics.summary(), file=sys.stderr)
+    return 1 if counts["error"] else 0
+
+
+def write_results(output, futures, counts):
+    for future in futures:
+        result = future.result()
+        counts["error" if "error" in result else "ok"] += 1
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+    output.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions against the LLM server without a GUI.")
+    parser.add_argument("input", help="JSONL file with one record per line (question, or title/body)")
+    parser.add_argument("output", help="JSONL file to write answers and timings to")
+    parser.add_argument("-j", "--parallelism", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--base-url", help="server to query (default: LLM_SERVER_URL or the Diamond server)")
+    parser.add_argument("--timeout", type=float, default=300, help="read timeout per request in seconds")
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="overwrite the output instead of skipping ids that already have an answer",
+    )
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
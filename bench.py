@@ -0,0 +1,352 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from backends import backend_from_env
+from cache import cache_key
+from history_store import JsonlHistoryStore, SqliteHistoryStore
+from markdown_render import MarkdownStream, render_markdown
+from metrics import Metrics, percentile
+from stub_server import StubServer, make_answer, tokenize
+from transport import Transport
+
+LONG_ANSWER = make_answer("How do I submit a job on the cluster?", extra_tokens=3000)
+# Unclosed markers and links that would make a backtracking parser quadratic.
+PATHOLOGICAL = "**[a](" * 5000 + "*_`" * 5000
+
+# Run in a fresh interpreter per sample, so every start is as cold as the user's.
+STARTUP_PROBE = """
+import json, time
+start = time.perf_counter()
+import client_adv
+result = {"import_ms": (time.perf_counter() - start) * 1000}
+try:
+    app = client_adv.ModernChatbotUI()
+except Exception:
+    app = None
+if app is not None:
+    while not app.winfo_ismapped():
+        app.update()
+    app.update_idletasks()
+    result["window_ms"] = (time.perf_counter() - start) * 1000
+    while app.transport is None or app.history_store is None:
+        app.update()
+        time.sleep(0.001)
+    result["ready_ms"] = (time.perf_counter() - start) * 1000
+    app.on_close()
+print(json.dumps(result))
+"""
+STARTUP_PHASES = {
+    "import_ms": "modules imported",
+    "window_ms": "window on screen",
+    "ready_ms": "history and network ready",
+}
+
+
+def start_stub(args):
+    """Run a StubServer on a free local port in a background thread and return its URL."""
+    server = StubServer(
+        ("127.0.0.1", 0),
+        token_delay=args.token_delay,
+        quiet=True,
+        latency=args.latency,
+        failure_rate=args.failure_rate,
+        drop_rate=args.drop_rate,
+        extra_tokens=args.extra_tokens,
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def run_level(url, concurrency, count, stream, timeout):
+    """Send `count` distinct questions with `concurrency` in flight, through the client's Transport."""
+    transport = Transport(
+        url,
+        read_timeout=timeout,
+        pool_size=concurrency,
+        backend=backend_from_env(),
+        metrics=Metrics(window=count),
+    )
+    on_token = (lambda token: None) if stream else None
+
+    def ask(i):
+        # Distinct questions, so single-flight coalescing does not hide the load.
+        try:
+            return "error" not in transport.ask(f"bench c{concurrency} #{i}", on_token=on_token)
+        except (requests.exceptions.RequestException, ValueError):
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(ask, range(count)))
+    elapsed = time.perf_counter() - start
+    transport.close()
+
+    total = transport.metrics.percentiles("ask", "total_ms")
+    ttft = transport.metrics.percentiles("ask", "ttft_ms")
+    failed = results.count(False)
+    return {
+        "concurrency": concurrency,
+        "requests": count,
+        "failed": failed,
+        "error_rate": failed / count,
+        "retries": transport.metrics.counts("ask").get("retries", 0),
+        "throughput": count / elapsed,
+        "p50_ms": total[0.5],
+        "p95_ms": total[0.95],
+        "p99_ms": total[0.99],
+        "ttft_p50_ms": ttft[0.5],
+    }
+
+
+def format_ms(value):
+    return "-" if value is None else f"{value:.0f}"
+
+
+def load(args):
+    server = None
+    url = args.url
+    if url is None:
+        server, url = start_stub(args)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    rows = []
+    try:
+        for concurrency in levels:
+            rows.append(run_level(url, concurrency, args.requests, not args.no_stream, args.timeout))
+            if not args.json:
+                print_load_row(rows[-1], header=len(rows) == 1)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    if args.json:
+        print(json.dumps({"target": url, "levels": rows}, indent=2))
+    return 0
+
+
+def print_load_row(row, header):
+    if header:
+        print(f"{'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttft ms':>8} {'errors':>7} {'retries':>7}")
+    print(
+        f"{row['concurrency']:>5} {row['throughput']:>8.1f} {format_ms(row['p50_ms']):>8} "
+        f"{format_ms(row['p95_ms']):>8} {format_ms(row['p99_ms']):>8} {format_ms(row['ttft_p50_ms']):>8} "
+        f"{row['error_rate']:>7.1%} {row['retries']:>7}"
+    )
+
+
+def time_calls(fn, iterations):
+    """Run fn() `iterations` times; return per-call times in microseconds, sorted."""
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1e6)
+    times.sort()
+    return times
+
+
+def stream_markdown(tokens):
+    md = MarkdownStream()
+    for token in tokens:
+        md.feed(token)
+    md.close()
+
+
+def history_entry(i):
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "question": f"How do I run benchmark job {i}?",
+        "response": LONG_ANSWER[:2000],
+    }
+
+
+def append_batch(store, start):
+    for i in range(start, start + 100):
+        store.append(history_entry(i))
+    store.flush()
+
+
+def transcript_benchmark(iterations):
+    """Append and render one long message in the virtual transcript, or None without a display."""
+    try:
+        import customtkinter as ctk
+
+        from transcript import VirtualTranscript
+
+        root = ctk.CTk()
+    except Exception:
+        return None
+    colors = {
+        "bg_dark": "#1E1E2E",
+        "accent": "#7B68EE",
+        "warning": "#FFB86C",
+        "error": "#FF5555",
+        "text_light": "#F8F8F2",
+        "text_muted": "#A6ADC8",
+        "user_message_bg": "#313244",
+        "bot_message_bg": "#45475A",
+        "code_bg": "#2A2B3D",
+        "link": "#8BE9FD",
+    }
+    transcript = VirtualTranscript(root, colors)
+    transcript.pack(fill="both", expand=True)
+    root.update()
+    segments = render_markdown(LONG_ANSWER)
+
+    def render():
+        transcript.append("bot", segments=list(segments))
+        transcript.refresh()
+
+    try:
+        return time_calls(render, iterations)
+    finally:
+        root.destroy()
+
+
+def hot(args):
+    tokens = tokenize(LONG_ANSWER)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        jsonl = JsonlHistoryStore(os.path.join(tmp, "bench.jsonl"), legacy_path=os.path.join(tmp, "none.json"))
+        sqlite = SqliteHistoryStore(os.path.join(tmp, "bench.db"), import_path=os.path.join(tmp, "none.jsonl"))
+        counter = iter(range(0, 10**9, 100))
+        benchmarks = {
+            "render_markdown (20 KB answer)": lambda: render_markdown(LONG_ANSWER),
+            "MarkdownStream (per-token feed)": lambda: stream_markdown(tokens),
+            "render_markdown (pathological)": lambda: render_markdown(PATHOLOGICAL),
+            "cache_key": lambda: cache_key("http://server", "  How do I submit a JOB?  "),
+            "save_history jsonl (100 + flush)": lambda: append_batch(jsonl, next(counter)),
+            "save_history sqlite (100 + flush)": lambda: append_batch(sqlite, next(counter)),
+        }
+        for name, fn in benchmarks.items():
+            fn()
+            results[name] = time_calls(fn, args.iterations)
+        jsonl.close()
+        sqlite.close()
+
+    rendering = transcript_benchmark(args.iterations)
+    if rendering is not None:
+        results["transcript append + refresh"] = rendering
+
+    summary = {
+        name: {
+            "mean_us": sum(times) / len(times),
+            "p50_us": percentile(times, 0.5),
+            "p95_us": percentile(times, 0.95),
+        }
+        for name, times in results.items()
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        width = max(len(name) for name in summary)
+        print(f"{'benchmark':<{width}} {'mean µs':>10} {'p50 µs':>10} {'p95 µs':>10}")
+        for name, row in summary.items():
+            print(f"{name:<{width}} {row['mean_us']:>10.1f} {row['p50_us']:>10.1f} {row['p95_us']:>10.1f}")
+        if rendering is None:
+            print("transcript rendering skipped: no display", file=sys.stderr)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    if args.baseline:
+        return compare(summary, args.baseline, args.tolerance)
+    return 0
+
+
+def startup(args):
+    root = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # A history log of realistic size, so opening the store costs what it does in use.
+        store = JsonlHistoryStore(os.path.join(tmp, "chatbot_logs.jsonl"), legacy_path=os.path.join(tmp, "none.json"))
+        for i in range(args.history):
+            store.append(history_entry(i))
+        store.close()
+        env = dict(os.environ, PYTHONPATH=root, LLM_SERVER_URL="http://127.0.0.1:9")
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, "-c", STARTUP_PROBE], cwd=tmp, env=env, capture_output=True, text=True, check=True
+            ).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    summary = {}
+    for field, label in STARTUP_PHASES.items():
+        times = sorted(sample[field] for sample in samples if field in sample)
+        if times:
+            summary[label] = {"p50_ms": percentile(times, 0.5), "max_ms": times[-1]}
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        width = max(len(label) for label in summary)
+        print(f"{'phase':<{width}} {'p50 ms':>8} {'max ms':>8}")
+        for label, row in summary.items():
+            print(f"{label:<{width}} {row['p50_ms']:>8.0f} {row['max_ms']:>8.0f}")
+        if len(summary) == 1:
+            print("window timings skipped: no display", file=sys.stderr)
+    return 0
+
+
+def compare(summary, path, tolerance):
+    """Fail if any benchmark's median is more than `tolerance` times its baseline."""
+    with open(path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressed = []
+    for name, row in summary.items():
+        before = baseline.get(name)
+        # Medians, because one slow GC pause or fsync skews a mean.
+        if before and row["p50_us"] > before["p50_us"] * tolerance:
+            regressed.append(f"{name}: {before['p50_us']:.1f} -> {row['p50_us']:.1f} µs")
+    for line in regressed:
+        print(f"regression: {line}", file=sys.stderr)
+    return 1 if regressed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the client under load and its hot paths.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    load_parser = commands.add_parser("load", help="throughput and latency at several concurrency levels")
+    load_parser.add_argument("--url", help="server to load (default: a local stub server)")
+    load_parser.add_argument("-c", "--concurrency", default="1,4,16", help="comma-separated levels")
+    load_parser.add_argument("-n", "--requests", type=int, default=100, help="questions per level")
+    load_parser.add_argument("--no-stream", action="store_true", help="ask for plain JSON answers")
+    load_parser.add_argument("--timeout", type=float, default=60, help="read timeout per request in seconds")
+    load_parser.add_argument("--json", action="store_true", help="print results as JSON")
+    stub = load_parser.add_argument_group("local stub server")
+    stub.add_argument("--latency", type=float, default=0.05, help="seconds before answering")
+    stub.add_argument("--token-delay", type=float, default=0.005, help="seconds between tokens")
+    stub.add_argument("--failure-rate", type=float, default=0.0, help="fraction answered with 503")
+    stub.add_argument("--drop-rate", type=float, default=0.0, help="fraction of streams cut off")
+    stub.add_argument("--extra-tokens", type=int, default=0, help="filler tokens per answer")
+    load_parser.set_defaults(run=load)
+
+    hot_parser = commands.add_parser("hot", help="time client-side hot paths, no network needed")
+    hot_parser.add_argument("-i", "--iterations", type=int, default=50)
+    hot_parser.add_argument("--json", action="store_true", help="print results as JSON")
+    hot_parser.add_argument("--save", help="write the results to this JSON file")
+    hot_parser.add_argument("--baseline", help="JSON file from --save to compare against")
+    hot_parser.add_argument("--tolerance", type=float, default=2.0, help="allowed slowdown factor")
+    hot_parser.set_defaults(run=hot)
+
+    startup_parser = commands.add_parser("startup", help="cold start time of client_adv.py, one process per run")
+    startup_parser.add_argument("-r", "--runs", type=int, default=10)
+    startup_parser.add_argument("--history", type=int, default=1000, help="entries in the history log")
+    startup_parser.add_argument("--json", action="store_true", help="print results as JSON")
+    startup_parser.set_defaults(run=startup)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MEMORY_ENTRIES = 256
+DEFAULT_DISK_BYTES = 64 * 1024 * 1024
+
+
+def normalize_question(question):
+    """Fold case, Unicode forms, whitespace and trailing punctuation so trivially different re-asks match."""
+    question = unicodedata.normalize("NFKC", question).casefold()
+    question = re.sub(r"\s+", " ", question).strip()
+    return question.rstrip("?!. ")
+
+
+def cache_key(server, question):
+    return hashlib.sha256(f"{server}\n{normalize_question(question)}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Answers keyed by server and normalized question: an LRU in memory over an SQLite file.
+
+    Entries expire after `ttl` seconds. The memory tier holds at most
+    `memory_entries` answers; the disk tier evicts least recently used rows
+    once it grows past `disk_bytes`. get() runs on the UI thread, so it never
+    writes and never waits for a write: it reads through a connection of its
+    own (the file is in WAL mode) under a lock that put() holds only for the
+    memory tier. The times entries were used are kept in memory and stored
+    with the next put() or on close().
+    """
+
+    def __init__(
+        self,
+        path="chatbot_cache.db",
+        ttl=DEFAULT_TTL,
+        memory_entries=DEFAULT_MEMORY_ENTRIES,
+        disk_bytes=DEFAULT_DISK_BYTES,
+    ):
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()
+        self.used = {}
+        self.lock = threading.Lock()
+        self.db_lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cache_used ON cache(used)")
+        self.conn.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.ttl,))
+        self.conn.commit()
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        self.reader = sqlite3.connect(path, check_same_thread=False)
+
+    @classmethod
+    def from_env(cls):
+        """Return a cache if LLM_CACHE is set, otherwise None (caching is opt-in)."""
+        env = os.environ
+        if env.get("LLM_CACHE", "").lower() not in ("1", "true", "yes", "on"):
+            return None
+        return cls(
+            ttl=float(env.get("LLM_CACHE_TTL", DEFAULT_TTL)),
+            disk_bytes=int(float(env.get("LLM_CACHE_MAX_MB", DEFAULT_DISK_BYTES / 2**20)) * 2**20),
+        )
+
+    def get(self, server, question):
+        key = cache_key(server, question)
+        now = time.time()
+        with self.lock:
+            item = self.memory.get(key)
+            if item is not None:
+                created, data = item
+                if now - created <= self.ttl:
+                    self.memory.move_to_end(key)
+                    self.used[key] = now
+                    return data
+                del self.memory[key]
+
+            row = self.reader.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if now - created > self.ttl:
+                # Left for the next put() of this question or the purge at startup.
+                return None
+            self.used[key] = now
+            data = json.loads(value)
+            self.remember(key, created, data)
+            return data
+
+    def put(self, server, question, data):
+        key = cache_key(server, question)
+        value = json.dumps(data, ensure_ascii=False)
+        size = len(value.encode("utf-8"))
+        now = time.time()
+        with self.lock:
+            self.remember(key, now, data)
+            self.used.pop(key, None)
+        with self.db_lock:
+            self.delete(key)
+            self.conn.execute(
+                "INSERT INTO cache (key, value, size, created, used) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self.size += size
+            self.store_used()
+            if self.size > self.disk_bytes:
+                self.evict()
+            self.conn.commit()
+
+    def store_used(self):
+        """Write the use times collected by get(); the caller holds db_lock and commits."""
+        with self.lock:
+            used, self.used = self.used, {}
+        if used:
+            self.conn.executemany("UPDATE cache SET used = ? WHERE key = ?", [(t, k) for k, t in used.items()])
+
+    def remember(self, key, created, data):
+        self.memory[key] = (created, data)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def delete(self, key):
+        row = self.conn.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self.conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self.size -= row[0]
+
+    def evict(self):
+        """Drop least recently used rows until the file is back under 90% of its budget."""
+        target = self.disk_bytes * 0.9
+        while self.size > target:
+            rows = self.conn.execute("SELECT key, size FROM cache ORDER BY used LIMIT 100").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self.size <= target:
+                    break
+                self.conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                with self.lock:
+                    self.memory.pop(key, None)
+                self.size -= size
+
+    def close(self):
+        with self.db_lock:
+            self.store_used()
+            self.conn.commit()
+            self.conn.close()
+        with self.lock:
+            self.reader.close()
@@ -0,0 +1,82 @@
+import gzip
+import json
+import os
+import threading
+
+# Records buffered by the gzip stream before it is flushed to disk.
+FLUSH_EVERY = 50
+
+
+def open_text(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def read_capture(path):
+    """Yield the records of a capture (or of a replay's results) oldest first."""
+    with open_text(path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A capture cut short by a crash ends in a partial line.
+                continue
+            if record.get("kind", "ask") == "ask":
+                yield record
+
+
+class Capture:
+    """Log of every /ask exchange the transport makes, for replay.py.
+
+    Each record has what was asked (question, history, whether it streamed),
+    when, and what came back: status, error, timings and sizes as in the
+    metrics samples, and the answer. Names ending in .gz are written
+    gzip-compressed, which shrinks the repetitive history a lot.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.output = open_text(path, "a")
+        self.unflushed = 0
+
+    @classmethod
+    def from_env(cls):
+        """A Capture writing to LLM_CAPTURE_FILE, or None if it is not set."""
+        path = os.environ.get("LLM_CAPTURE_FILE")
+        return cls(path) if path else None
+
+    def record(self, question, history, stream, sample, result=None):
+        """Log one /ask call; `sample` is its finished metrics sample."""
+        record = {
+            "timestamp": sample["timestamp"],
+            "question": question,
+            "history": history or [],
+            "stream": stream,
+            "endpoint": sample["endpoint"],
+            "status": sample["status"],
+            "error": sample["error"],
+            "ttfb_ms": sample["ttfb_ms"],
+            "ttft_ms": sample["ttft_ms"],
+            "total_ms": sample["total_ms"],
+            "request_bytes": sample["request_bytes"],
+            "response_bytes": sample["response_bytes"],
+            "attempts": sample["attempts"],
+            "answer": (result or {}).get("answer"),
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            if self.output is None:
+                return
+            self.output.write(line)
+            self.unflushed += 1
+            if self.unflushed >= FLUSH_EVERY:
+                self.output.flush()
+                self.unflushed = 0
+
+    def close(self):
+        with self.lock:
+            if self.output is not None:
+                self.output.close()
+                self.output = None
@@ -4,6 +4,9 @@ from tkinter import messagebox, scrolledtext
 
 import requests
 
+from dispatcher import Dispatcher
+from transport import Transport
+
 
 class RagClient(tk.Tk):
     def __init__(self):
@@ -21,6 +24,12 @@ class RagClient(tk.Tk):
         self.button_color = "#4CAF50"
         self.text_color = "#212121"
 
+        self.transport = Transport.from_env(
+            "http://172.23.167.1:5000", read_timeout=30, health_timeout=5
+        )
+        # Worker threads hand their results to the Tk thread through the dispatcher.
+        self.dispatcher = Dispatcher(self)
+
         # Top frame for status
         top_frame = tk.Frame(self, bg=self.bg_color)
         top_frame.grid(row=0, column=0, sticky="ew", padx=20, pady=(20, 10))
@@ -130,13 +139,14 @@ class RagClient(tk.Tk):
 
     def check_connection(self):
         try:
-            response = requests.get("http://172.23.167.1:5000/health", timeout=5)
-            response.raise_for_status()
+            self.transport.health()
             self.connected = True
-            self.status_label.config(text="Connected to server", fg="#4CAF50")
+            text, color = "Connected to server", "#4CAF50"
         except requests.exceptions.RequestException:
             self.connected = False
-            self.status_label.config(text="Not connected to server", fg="#D32F2F")
+            text, color = "Not connected to server", "#D32F2F"
+        # Runs on its own thread, so the label is updated from the Tk thread.
+        self.dispatcher.post(lambda: self.status_label.config(text=text, fg=color), key="status")
 
     def on_ask(self):
         if not self.connected:
@@ -160,14 +170,9 @@ class RagClient(tk.Tk):
 
     def make_request(self, question):
         try:
-            payload = {"question": question}
-            response = requests.post(
-                "http://172.23.167.1:5000/ask", json=payload, timeout=30
-            )
-            response.raise_for_status()
-            data = response.json()
+            data = self.transport.ask(question)
             self.update_response(data)
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
             self.update_response({"error": str(e)})
 
     def update_response(self, data):
@@ -188,7 +193,7 @@ class RagClient(tk.Tk):
                 text="Ask", state=tk.NORMAL, bg=self.button_color, fg="white"
             )
 
-        self.after(0, _update)
+        self.dispatcher.post(_update)
 
     def copy_response(self):
         text = self.response_text.get(1.0, tk.END).strip()
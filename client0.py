@@ -1,12 +1,16 @@
-import json
-import os
 import threading
-import re
 from datetime import datetime
 
 import customtkinter as ctk
 import requests
 
+from dispatcher import Dispatcher
+from health import HealthMonitor
+from history_store import JsonlHistoryStore
+from markdown_render import configure_tags, insert_segments, render_markdown
+from transport import Transport
+from uiprofiler import UIProfiler
+
 
 class ModernChatbot(ctk.CTk):
     def __init__(self):
@@ -24,9 +28,11 @@ class ModernChatbot(ctk.CTk):
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(0, weight=1)
 
+        self.transport = Transport.from_env(read_timeout=120, health_timeout=30)
+        self.transport.resilience.on_event = self.on_resilience_event
+
         # Chat history storage
-        self.history_file = "chatbot_logs.json"
-        self.load_history()
+        self.history_store = JsonlHistoryStore()
 
         # Main frame
         self.main_frame = ctk.CTkFrame(self, corner_radius=0)
@@ -45,6 +51,12 @@ class ModernChatbot(ctk.CTk):
         )
         self.chat_display.grid(row=0, column=0, sticky="nsew", padx=20, pady=(20, 10))
         self.chat_display.configure(state="disabled")
+        # CTkTextbox refuses fonts in tag_config, so the markdown tags go on the inner Tk Text.
+        configure_tags(
+            self.chat_display._textbox,
+            {"code_bg": "#1E1E1E", "text_muted": "#9E9E9E", "link": "#64B5F6"},
+            size=15,
+        )
 
         # Input frame
         self.input_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
@@ -102,40 +114,55 @@ class ModernChatbot(ctk.CTk):
         )
         self.copy_button.grid(row=1, column=0)
 
+        # Worker threads hand results to the Tk thread only through the dispatcher.
+        self.dispatcher = Dispatcher(self)
+
         # Connection status
-        self.connected = False
-        threading.Thread(target=self.check_connection, daemon=True).start()
+        self.health = HealthMonitor(self.transport, on_change=self.on_health_change)
+        self.health.start()
 
-    def load_history(self):
-        if os.path.exists(self.history_file):
-            with open(self.history_file, "r") as f:
-                self.history = json.load(f)
-        else:
-            self.history = []
+        # LLM_UI_PROFILE=1 watches the main loop for stalls; F12 shows what it found.
+        self.profiler = UIProfiler.from_env(self)
+        if self.profiler is not None:
+            self.bind("<F12>", self.profiler.show_panel)
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def save_history(self, question, response, metadata):
         timestamp = datetime.now().isoformat()
         entry = {"timestamp": timestamp, "question": question, "response": response, "metadata": metadata}
-        self.history.append(entry)
-        with open(self.history_file, "w") as f:
-            json.dump(self.history, f, indent=2)
-
-    def check_connection(self):
-        try:
-            response = requests.get("http://172.23.162.4:5000/health", timeout=30)
-            response.raise_for_status()
-            self.connected = True
+        self.history_store.append(entry)
+
+    def on_close(self):
+        self.dispatcher.stop()
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler.dump()
+        self.transport.close()
+        self.history_store.close()
+        self.destroy()
+
+    def on_health_change(self, connected):
+        if self.transport.resilience.breaker.state == "open":
+            self.update_status("Server unavailable (circuit open)", "#EF5350")
+        elif connected:
             self.update_status("Connected", "#4CAF50")
-        except requests.exceptions.RequestException:
-            self.connected = False
+        else:
             self.update_status("Disconnected", "#EF5350")
 
+    def on_resilience_event(self, state, detail):
+        if state == "retrying":
+            self.update_status(f"Retrying ({detail})...", "#FFA726")
+        else:
+            self.on_health_change(self.health.connected)
+
     def update_status(self, text, color):
-        self.after(0, lambda: self.status_label.configure(text=text, text_color=color))
+        self.dispatcher.post(lambda: self.status_label.configure(text=text, text_color=color), key="status")
 
     def on_send(self, event=None):
-        self.check_connection()
-        if not self.connected:
+        if self.health.is_stale():
+            self.health.refresh()
+        if self.health.is_known_down():
             self.show_error("Not connected to the server")
             return
 
@@ -155,34 +182,13 @@ class ModernChatbot(ctk.CTk):
 
     def make_request(self, question):
         try:
-            payload = {"question": question}
-            response = requests.post(
-                "http://172.23.162.4:5000/ask", json=payload, timeout=120
-            )
-            response.raise_for_status()
-            data = response.json()
-            self.connected = True
-            self.update_status("Connected", "#4CAF50")
-            self.update_response(data, question)
-        except requests.exceptions.RequestException as e:
-            self.connected = False
-            self.update_status("Disconnected", "#EF5350")
-            self.update_response({"error": str(e)}, question)
-
-    def process_markdown(self, text):
-        def replace_link(match):
-            link_text = match.group(1)
-            link_url = match.group(2)
-            return f"{link_text} ({link_url})"
-        
-        link_pattern = r'\[(.*?)\]\(((?:[^()]*|\([^()]*\))*)\)'
-        processed_text = re.sub(link_pattern, replace_link, text)
-        
-        processed_text = processed_text.replace("**", "").replace("*", "")
-        
-        processed_text = re.sub(r'^#+\s+', '', processed_text, flags=re.MULTILINE)
-        
-        return processed_text
+            data = self.transport.ask(question)
+            self.health.record_success()
+            self.dispatcher.post(self.update_response, data, question)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+                self.health.record_failure()
+            self.dispatcher.post(self.update_response, {"error": str(e)}, question)
 
     def update_response(self, data, question):
         self.chat_display.configure(state="normal")
@@ -192,9 +198,8 @@ class ModernChatbot(ctk.CTk):
             self.chat_display.insert("end", f"Bot: {response_text}", "error")
             self.chat_display.tag_config("error", foreground="#EF5350")
         else:
-            answer = data.get("answer", "")
-            plain_text = self.process_markdown(answer)
-            self.chat_display.insert("end", f"Bot: {plain_text}")
+            self.chat_display.insert("end", "Bot: ")
+            insert_segments(self.chat_display._textbox, "end", render_markdown(data.get("answer", "")))
 
         self.chat_display.configure(state="disabled")
         self.send_button.configure(state="normal", text="Send")
@@ -1,19 +1,62 @@
-import json
-import os
 import threading
-import re
+import traceback
 from datetime import datetime
-import tkinter as tk
-from tkinter import ttk
 import customtkinter as ctk
-import requests
-from PIL import Image, ImageTk
+
+from conversation import Conversation
+from dispatcher import Dispatcher
+from history_store import open_history_store
+from markdown_render import MarkdownStream, plain_text, render_markdown
+from sidebar import PAGE_SIZE, HistorySidebar
+from transcript import VirtualTranscript
+from uiprofiler import UIProfiler
+
+HISTORY_WINDOW = 1000
+SEARCH_DEBOUNCE_MS = 250
+STATS_REFRESH_MS = 2000
+QUEUED_TEXT = "Server unreachable: queued, and sent as soon as it is back."
+
+
+class StreamBuffer:
+    """Collects streamed chunks from a worker thread; the dispatcher flushes them once per frame."""
+
+    def __init__(self, dispatcher, on_flush):
+        self.dispatcher = dispatcher
+        self.on_flush = on_flush
+        self.lock = threading.Lock()
+        self.pending = []
+        self.scheduled = False
+        self.closed = False
+
+    def push(self, chunk):
+        with self.lock:
+            if self.closed:
+                return
+            self.pending.append(chunk)
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self.dispatcher.post(self.flush, key=self)
+
+    def flush(self):
+        with self.lock:
+            text = "".join(self.pending)
+            self.pending = []
+            self.scheduled = False
+            if self.closed:
+                return
+        if text:
+            self.on_flush(text)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.pending = []
+
 
 class ModernChatbotUI(ctk.CTk):
     def __init__(self):
         super().__init__()
-        self.message_widgets = []
-        self.message_count = 0  # Add message counter
         self.title("Diamond Chatbot")
         self.geometry("1100x800")
         self.minsize(800, 600)
@@ -35,7 +78,9 @@ class ModernChatbotUI(ctk.CTk):
             "error": "#FF5555",
             "warning": "#FFB86C",
             "user_message_bg": "#313244",
-            "bot_message_bg": "#45475A"
+            "bot_message_bg": "#45475A",
+            "code_bg": "#2A2B3D",
+            "link": "#8BE9FD"
         }
         
         # Configure grid
@@ -43,38 +88,127 @@ class ModernChatbotUI(ctk.CTk):
         self.grid_columnconfigure(1, weight=1)  # Chat area
         self.grid_rowconfigure(0, weight=1)
         
-        # Chat history storage
-        self.history_file = "chatbot_logs.json"
-        self.load_history()
+        # Worker threads hand results to the Tk thread only through the dispatcher.
+        self.dispatcher = Dispatcher(self)
+
+        # The network stack and the history store are opened once the window is
+        # on screen (see on_map); until then questions wait in the input box.
+        self.transport = None
+        self.health = None
+        self.scheduler = None
+        self.cache = None
+        self.outbox = None
+        # Outbox entry id -> transcript message showing it as queued.
+        self.queued = {}
+        self.history_store = None
+        self.history = []
+        self.unsaved = []
         self.current_history_index = -1
         
         # Create UI components
         self.create_sidebar()
         self.create_chat_area()
         
-        # Connection status
-        self.connected = False
-        threading.Thread(target=self.check_connection, daemon=True).start()
+        self.conversation = Conversation.from_env()
+        self.pending = []
+        self.bind("<Map>", self.on_map)
         
+        # LLM_UI_PROFILE=1 watches the main loop for stalls; F12 shows what it found.
+        self.profiler = UIProfiler.from_env(self)
+        if self.profiler is not None:
+            self.bind("<F12>", self.profiler.show_panel)
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
         # Keyboard shortcuts
         self.bind("<Control-l>", lambda e: self.clear_chat())
+        self.bind("<Escape>", self.cancel_latest)
         
+    def on_map(self, event):
+        # Every widget's <Map> reaches the toplevel binding; only the window itself counts.
+        if event.widget is not self:
+            return
+        self.unbind("<Map>")
+        threading.Thread(target=self.start_services, daemon=True).start()
+        threading.Thread(target=self.load_history, daemon=True).start()
+
+    def start_services(self):
+        # requests and urllib3 are most of the client's import time, so the
+        # network stack is imported off the Tk thread after the first paint.
+        from cache import ResponseCache
+        from health import HealthMonitor
+        from outbox import Outbox
+        from scheduler import RequestScheduler
+        from transport import Transport
+
+        transport = Transport.from_env(read_timeout=30, health_timeout=5)
+        transport.resilience.on_event = self.on_resilience_event
+        health = HealthMonitor(transport, on_change=self.on_health_change)
+        scheduler = RequestScheduler.from_env()
+        cache = ResponseCache.from_env()
+        outbox = Outbox.from_env()
+        self.dispatcher.post(self.services_ready, transport, health, scheduler, cache, outbox)
+
+    def services_ready(self, transport, health, scheduler, cache, outbox):
+        self.transport = transport
+        self.health = health
+        self.scheduler = scheduler
+        self.cache = cache
+        self.outbox = outbox
+        # Questions still queued from an earlier session go out with the next reconnect.
+        for entry in outbox.queued() if outbox is not None else ():
+            self.add_user_message(entry["question"])
+            self.queued[entry["id"]] = self.transcript.append("bot", QUEUED_TEXT)
+        self.health.start()
+        self.refresh_stats()
+
     def load_history(self):
-        if os.path.exists(self.history_file):
-            try:
-                with open(self.history_file, "r") as f:
-                    self.history = json.load(f)
-            except json.JSONDecodeError:
-                self.history = []
-        else:
-            self.history = []
-    
+        # Only the recent window is kept in memory; the store reads it from the end of the log.
+        store = open_history_store()
+        entries = store.tail(HISTORY_WINDOW)
+        self.dispatcher.post(self.history_loaded, store, entries)
+
+    def history_loaded(self, store, entries):
+        self.history_store = store
+        # Answers that arrived while the store was opening go after the loaded ones.
+        self.history = (entries + self.history)[-HISTORY_WINDOW:]
+        for entry in self.unsaved:
+            store.append(entry)
+        self.unsaved = []
+        # Show the recent list, or rerun a search typed before the store was open.
+        self.search_query = None
+        self.run_search()
+
     def save_history(self, question, response):
         timestamp = datetime.now().isoformat()
         entry = {"timestamp": timestamp, "question": question, "response": response}
         self.history.append(entry)
-        with open(self.history_file, "w") as f:
-            json.dump(self.history, f, indent=2)
+        if len(self.history) > HISTORY_WINDOW:
+            del self.history[0]
+        if self.history_store is None:
+            self.unsaved.append(entry)
+        else:
+            self.history_store.append(entry)
+        return entry
+
+    def on_close(self):
+        self.dispatcher.stop()
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler.dump()
+        if self.scheduler is not None:
+            self.scheduler.shutdown()
+        if self.transport is not None:
+            self.transport.close()
+        if self.history_store is None and self.unsaved:
+            self.history_store = open_history_store()
+            for entry in self.unsaved:
+                self.history_store.append(entry)
+        if self.history_store is not None:
+            self.history_store.close()
+        if self.cache is not None:
+            self.cache.close()
+        self.destroy()
             
     def create_sidebar(self):
         self.sidebar = ctk.CTkFrame(self, corner_radius=0, fg_color=self.colors["bg_medium"], width=250)
@@ -109,18 +243,34 @@ class ModernChatbotUI(ctk.CTk):
         )
         self.history_label.grid(row=1, column=0, sticky="w", padx=20, pady=(20, 10))
         
+        self.search_query = ""
+        self.search_generation = 0
+        self.search_job = None
+        self.search_entry = ctk.CTkEntry(
+            self.sidebar,
+            placeholder_text="Search history...",
+            font=("Roboto", 12),
+            fg_color=self.colors["bg_dark"],
+            border_width=0,
+            corner_radius=8
+        )
+        self.search_entry.grid(row=2, column=0, sticky="ew", padx=20, pady=(0, 10))
+        self.search_entry.bind("<KeyRelease>", self.on_search_changed)
+        
         self.history_frame = ctk.CTkScrollableFrame(
             self.sidebar,
             fg_color="transparent",
             corner_radius=0
         )
-        self.history_frame.grid(row=2, column=0, sticky="nsew", padx=10, pady=(0, 10))
-        self.sidebar.grid_rowconfigure(2, weight=1)
+        self.history_frame.grid(row=3, column=0, sticky="nsew", padx=10, pady=(0, 10))
+        self.sidebar.grid_rowconfigure(3, weight=1)
         
-        self.update_history_list()
+        self.history_list = HistorySidebar(
+            self.history_frame, self.colors, self.load_history_item, self.load_history_page
+        )
         
         self.action_frame = ctk.CTkFrame(self.sidebar, fg_color="transparent")
-        self.action_frame.grid(row=3, column=0, sticky="ew", padx=20, pady=20)
+        self.action_frame.grid(row=4, column=0, sticky="ew", padx=20, pady=20)
         self.action_frame.grid_columnconfigure(0, weight=1)
         self.action_frame.grid_columnconfigure(1, weight=1)
         
@@ -147,7 +297,7 @@ class ModernChatbotUI(ctk.CTk):
         self.theme_btn.grid(row=0, column=1, sticky="ew", padx=(5, 0))
         
         self.status_frame = ctk.CTkFrame(self.sidebar, fg_color="transparent")
-        self.status_frame.grid(row=4, column=0, sticky="ew", padx=20, pady=(0, 20))
+        self.status_frame.grid(row=5, column=0, sticky="ew", padx=20, pady=(0, 20))
         
         self.status_indicator = ctk.CTkLabel(
             self.status_frame,
@@ -164,6 +314,15 @@ class ModernChatbotUI(ctk.CTk):
             text_color=self.colors["text_muted"]
         )
         self.status_label.grid(row=0, column=1, sticky="w")
+
+        self.stats_label = ctk.CTkLabel(
+            self.status_frame,
+            text="",
+            font=("Roboto", 11),
+            justify="left",
+            text_color=self.colors["text_muted"]
+        )
+        self.stats_label.grid(row=1, column=0, columnspan=2, sticky="w")
         
     def create_chat_area(self):
         self.chat_area = ctk.CTkFrame(self, corner_radius=0, fg_color=self.colors["bg_dark"])
@@ -171,13 +330,8 @@ class ModernChatbotUI(ctk.CTk):
         self.chat_area.grid_columnconfigure(0, weight=1)
         self.chat_area.grid_rowconfigure(0, weight=1)
         
-        self.messages_frame = ctk.CTkScrollableFrame(
-            self.chat_area,
-            fg_color="transparent",
-            corner_radius=0
-        )
-        self.messages_frame.grid(row=0, column=0, sticky="nsew", padx=20, pady=20)
-        self.messages_frame.grid_columnconfigure(0, weight=1)
+        self.transcript = VirtualTranscript(self.chat_area, self.colors)
+        self.transcript.grid(row=0, column=0, sticky="nsew", padx=20, pady=20)
         
         self.add_bot_message("Hello! I'm Diamond, your AI assistant. How can I help you today?")
         
@@ -240,103 +394,28 @@ class ModernChatbotUI(ctk.CTk):
         self.after(100, lambda: self.input_field.focus())
         
     def add_user_message(self, text):
-        message_frame = ctk.CTkFrame(
-            self.messages_frame,
-            fg_color=self.colors["user_message_bg"],
-            corner_radius=10
-        )
-        message_frame.grid(row=self.message_count, column=0, sticky="e", pady=(0, 15), padx=(80, 0))
-        
-        user_label = ctk.CTkLabel(
-            message_frame,
-            text="You",
-            font=("Roboto", 12, "bold"),
-            text_color=self.colors["accent"]
-        )
-        user_label.grid(row=0, column=0, sticky="w", padx=15, pady=(10, 0))
-        
-        message_label = ctk.CTkLabel(
-            message_frame,
-            text=text,
-            font=("Roboto", 14),
-            text_color=self.colors["text_light"],
-            justify="left",
-            wraplength=600
-        )
-        message_label.grid(row=1, column=0, sticky="w", padx=15, pady=(5, 10))
-        
-        self.message_count += 1
-        self.after(100, self.scroll_to_bottom)
+        return self.transcript.append("user", text)
         
     def add_bot_message(self, text):
-        message_frame = ctk.CTkFrame(
-            self.messages_frame,
-            fg_color=self.colors["bot_message_bg"],
-            corner_radius=10
-        )
-        message_frame.grid(row=self.message_count, column=0, sticky="w", pady=(0, 15), padx=(0, 80))
-        
-        bot_label = ctk.CTkLabel(
-            message_frame,
-            text="Diamond",
-            font=("Roboto", 12, "bold"),
-            text_color=self.colors["accent"]
-        )
-        bot_label.grid(row=0, column=0, sticky="w", padx=15, pady=(10, 0))
-        
-        message_label = ctk.CTkLabel(
-            message_frame,
-            text=text,
-            font=("Roboto", 14),
-            text_color=self.colors["text_light"],
-            justify="left",
-            wraplength=600
-        )
-        message_label.grid(row=1, column=0, sticky="w", padx=15, pady=(5, 10))
-        
         self.latest_bot_message = text
-        self.message_widgets.append(message_frame)
-        self.message_count += 1
-        self.after(100, self.scroll_to_bottom)
+        return self.transcript.append("bot", text)
         
     def add_error_message(self, text):
-        message_frame = ctk.CTkFrame(
-            self.messages_frame,
-            fg_color=self.colors["bot_message_bg"],
-            corner_radius=10
-        )
-        message_frame.grid(row=self.message_count, column=0, sticky="w", pady=(0, 15), padx=(0, 80))
-        
-        bot_label = ctk.CTkLabel(
-            message_frame,
-            text="Error",
-            font=("Roboto", 12, "bold"),
-            text_color=self.colors["error"]
-        )
-        bot_label.grid(row=0, column=0, sticky="w", padx=15, pady=(10, 0))
-        
-        message_label = ctk.CTkLabel(
-            message_frame,
-            text=text,
-            font=("Roboto", 14),
-            text_color=self.colors["error"],
-            justify="left",
-            wraplength=600
-        )
-        message_label.grid(row=1, column=0, sticky="w", padx=15, pady=(5, 10))
-        
-        self.message_count += 1
-        self.after(100, self.scroll_to_bottom)
-        
-    def scroll_to_bottom(self):
-        self.messages_frame._parent_canvas.yview_moveto(1.0)
+        return self.transcript.append("error", text)
         
     def on_send(self, event=None):
         if event and event.state & 0x4:
             return
+        if self.transport is None:
+            # Still starting up; the question stays in the input box.
+            return "break"
             
-        self.check_connection()
-        if not self.connected:
+        # Never probe on the Tk thread: read the cached state and let the monitor
+        # refresh it in the background if it has gone stale.
+        if self.health.is_stale():
+            self.health.refresh()
+        unreachable = self.health.is_known_down() or self.transport.resilience.breaker.state == "open"
+        if unreachable and self.outbox is None:
             self.add_error_message("Not connected to the server")
             return
 
@@ -344,74 +423,232 @@ class ModernChatbotUI(ctk.CTk):
         if not question:
             return
 
-        self.send_button.configure(state="disabled", text="...")
         self.input_field.delete("1.0", "end")
         
         self.add_user_message(question)
-        
-        threading.Thread(target=self.make_request, args=(question,)).start()
-        
-    def make_request(self, question):
+
+        # Follow-up questions depend on their context, so only opening questions use the cache.
+        history = self.conversation.window()
+        if self.cache is not None and not history:
+            cached = self.cache.get(self.transport.base_url, question)
+            if cached is not None:
+                self.show_cached_answer(question, cached)
+                return
+
+        if unreachable:
+            entry = self.outbox.add(question, history)
+            self.queued[entry["id"]] = self.transcript.append("bot", QUEUED_TEXT)
+            self.refresh_status()
+            return
+
+        # Each question gets its own placeholder bubble; several can be in flight at once.
+        message_id = self.transcript.append("bot", "Thinking... (Esc to cancel)")
+        self.send_question(question, history, message_id)
+
+    def send_question(self, question, history, message_id, outbox_id=None):
+        stream = {
+            "message_id": message_id,
+            "text": "",
+            "started": False,
+            "markdown": MarkdownStream(),
+            "conversation": self.conversation.generation,
+            "outbox_id": outbox_id,
+        }
+        stream["buffer"] = StreamBuffer(self.dispatcher, lambda chunk: self.append_stream_chunk(stream, chunk))
+        stream["handle"] = self.scheduler.submit(
+            self.transport.base_url,
+            self.make_request,
+            question,
+            history,
+            stream,
+            endpoints=len(self.transport.pool),
+        )
+        self.pending.append(stream)
+
+    def drain_outbox(self):
+        """Send queued questions, oldest first, as far as the outbox's concurrency allows."""
+        if self.outbox is None or not self.health.connected:
+            return
+        while True:
+            entry = self.outbox.claim()
+            if entry is None:
+                break
+            message_id = self.queued.pop(entry["id"], None)
+            if message_id is None or self.transcript.message(message_id) is None:
+                # Its bubble went with a cleared chat; show the question again.
+                self.add_user_message(entry["question"])
+                message_id = self.transcript.append("bot", "")
+            self.transcript.set_text(message_id, "Sending queued question... (Esc to cancel)")
+            self.send_question(entry["question"], entry["history"], message_id, outbox_id=entry["id"])
+        self.refresh_status()
+
+    def requeue(self, question, history, stream):
+        """Put a question whose request never reached the server (back) in the outbox."""
+        self.finish_request(stream)
+        if stream["handle"].is_cancelled():
+            return
+        if stream["outbox_id"] is None:
+            stream["outbox_id"] = self.outbox.add(question, history)["id"]
+        else:
+            self.outbox.release(stream["outbox_id"])
+        self.queued[stream["outbox_id"]] = stream["message_id"]
+        self.transcript.set_text(stream["message_id"], QUEUED_TEXT, role="bot")
+        self.refresh_status()
+
+    def show_cached_answer(self, question, data):
+        answer = data.get("answer", "")
+        segments = render_markdown(answer)
+        self.transcript.append("cached", segments=segments)
+        self.latest_bot_message = plain_text(segments)
+        self.conversation.add(question, answer)
+        entry = self.save_history(question, answer)
+        self.history_list.prepend(entry)
+
+    def cancel_latest(self, event=None):
+        if not self.pending:
+            return
+        stream = self.pending.pop()
+        stream["handle"].cancel()
+        stream["buffer"].close()
+        if stream["outbox_id"] is not None:
+            self.outbox.remove(stream["outbox_id"])
+        self.transcript.set_text(stream["message_id"], "Request cancelled.", role="error")
+
+    def finish_request(self, stream):
+        if stream in self.pending:
+            self.pending.remove(stream)
+
+    def make_request(self, handle, question, history, stream):
+        import requests
+
+        from resilience import CircuitOpenError
+
         try:
-            payload = {"question": question}
-            response = requests.post(
-                "http://172.23.162.4:5000/ask", json=payload, timeout=30
+            # The read timeout applies between chunks, so long generations that keep
+            # producing tokens no longer fail; the connect timeout stays short.
+            data = self.transport.ask(
+                question, on_token=lambda token: self.on_token(stream, token), handle=handle, history=history
             )
-            response.raise_for_status()
-            data = response.json()
-            self.connected = True
-            self.update_status("Connected", self.colors["success"])
-            self.update_response(data, question)
-        except requests.exceptions.RequestException as e:
-            self.connected = False
-            self.update_status("Disconnected", self.colors["error"])
-            self.add_error_message(f"Connection error: {str(e)}")
-            self.after(0, lambda: self.send_button.configure(state="normal", text="Send"))
+            if handle.is_cancelled():
+                return
+            self.health.record_success()
+            if self.cache is not None and not history and "error" not in data:
+                self.cache.put(self.transport.base_url, question, data)
+            self.dispatcher.post(self.update_response, data, question, stream)
+        except Exception as e:
+            # Closing the socket of a cancelled request surfaces here as an arbitrary error.
+            if handle.is_cancelled():
+                return
+            if not isinstance(e, (requests.exceptions.RequestException, ValueError)):
+                # A bug, not a failed request; raising it would be lost in the pool worker
+                # and leave the bubble thinking forever.
+                traceback.print_exc()
+                stream["buffer"].close()
+                self.dispatcher.post(self.show_request_error, stream, f"Unexpected error: {e}")
+                return
+            # An open circuit is the breaker's verdict, not news about the connection.
+            if isinstance(e, CircuitOpenError):
+                pass
+            elif isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+                self.health.record_failure()
+            stream["buffer"].close()
+            # Without a single token the question went unanswered; queue it instead of
+            # making the user retype it once the server is back.
+            if self.outbox is not None and isinstance(e, requests.exceptions.ConnectionError) and not stream["started"]:
+                self.dispatcher.post(self.requeue, question, history, stream)
+                return
+            error_text = f"Connection error: {str(e)}"
+            self.dispatcher.post(self.show_request_error, stream, error_text)
 
-    def process_markdown(self, text):
-        def replace_link(match):
-            link_text = match.group(1)
-            link_url = match.group(2)
-            return f"{link_text} ({link_url})"
-        
-        link_pattern = r'\[(.*?)\]\(((?:[^()]*|\([^()]*\))*)\)'
-        processed_text = re.sub(link_pattern, replace_link, text)
-        
-        processed_text = processed_text.replace("**", "").replace("*", "")
-        
-        processed_text = re.sub(r'^#+\s+', '', processed_text, flags=re.MULTILINE)
-        
-        return processed_text
+    def on_token(self, stream, token):
+        stream["started"] = True
+        stream["buffer"].push(token)
+
+    def show_request_error(self, stream, error_text):
+        self.finish_request(stream)
+        self.refresh_status()
+        if stream["outbox_id"] is not None:
+            # It reached the server and failed there; the error bubble is its answer,
+            # so it must not hold an outbox slot or be resent on the next launch.
+            self.outbox.remove(stream["outbox_id"])
+            self.drain_outbox()
+        if stream["handle"].is_cancelled():
+            return
+        self.transcript.set_text(stream["message_id"], error_text, role="error")
 
-    def update_response(self, data, question):
+    def append_stream_chunk(self, stream, chunk):
+        # Only lines the chunk completes are rendered; the partial last line is shown raw.
+        segments = stream["markdown"].feed(chunk)
+        if stream["text"]:
+            self.transcript.extend(stream["message_id"], segments, stream["markdown"].pending)
+        else:
+            self.transcript.set_segments(stream["message_id"], segments, tail=stream["markdown"].pending)
+        stream["text"] += chunk
+        self.latest_bot_message = stream["text"]
+
+    def update_response(self, data, question, stream):
+        stream["buffer"].close()
+        self.finish_request(stream)
+        self.refresh_status()
+        if stream["handle"].is_cancelled():
+            return
         if "error" in data:
             error_text = f"Error: {data['error']}"
-            self.add_error_message(error_text)
+            self.transcript.set_text(stream["message_id"], error_text, role="error")
         else:
-            answer = data.get("answer", "")
-            plain_text = self.process_markdown(answer)
-            self.add_bot_message(plain_text)
-            self.latest_bot_message = plain_text
-
-        self.send_button.configure(state="normal", text="Send")
+            segments = render_markdown(data.get("answer", ""))
+            self.transcript.set_segments(stream["message_id"], segments)
+            self.latest_bot_message = plain_text(segments)
+            if stream["conversation"] == self.conversation.generation:
+                self.conversation.add(question, data.get("answer", ""))
 
         response = data.get("answer", data.get("error", "Unknown error"))
-        self.save_history(question, response)
-        self.update_history_list()
-        
-    def check_connection(self):
-        try:
-            response = requests.get("http://172.23.162.4:5000/health", timeout=5)
-            response.raise_for_status()
-            self.connected = True
+        entry = self.save_history(question, response)
+        self.history_list.prepend(entry)
+        if stream["outbox_id"] is not None:
+            self.outbox.remove(stream["outbox_id"])
+            self.drain_outbox()
+        
+    def on_health_change(self, connected):
+        self.refresh_status()
+        if connected:
+            self.dispatcher.post(self.drain_outbox, key="drain_outbox")
+
+    def on_resilience_event(self, state, detail):
+        if state == "retrying":
+            self.update_status(f"Retrying ({detail})...", self.colors["warning"])
+        elif state == "half_open":
+            self.update_status("Reconnecting...", self.colors["warning"])
+        else:
+            self.refresh_status()
+            if state == "closed":
+                # Questions queued while only /ask was failing: /health never went down,
+                # so on_health_change will not drain them.
+                self.dispatcher.post(self.drain_outbox, key="drain_outbox")
+
+    def refresh_stats(self):
+        text = self.transport.metrics.summary()
+        if text != self.stats_label.cget("text"):
+            self.stats_label.configure(text=text)
+        self.after(STATS_REFRESH_MS, self.refresh_stats)
+
+    def refresh_status(self):
+        if self.transport.resilience.breaker.state == "open":
+            self.update_status("Server unavailable (circuit open)", self.colors["error"])
+        elif self.health.connected:
             self.update_status("Connected", self.colors["success"])
-        except requests.exceptions.RequestException:
-            self.connected = False
+        elif self.outbox is not None and len(self.outbox):
+            self.update_status(f"Disconnected ({len(self.outbox)} queued)", self.colors["error"])
+        else:
             self.update_status("Disconnected", self.colors["error"])
 
     def update_status(self, text, color):
-        self.after(0, lambda: self.status_indicator.configure(text_color=color))
-        self.after(0, lambda: self.status_label.configure(text=text))
+        # Only the latest status still waiting for the next frame gets drawn.
+        self.dispatcher.post(self.show_status, text, color, key="status")
+
+    def show_status(self, text, color):
+        self.status_indicator.configure(text_color=color)
+        self.status_label.configure(text=text)
         
     def copy_response(self):
         if hasattr(self, 'latest_bot_message') and self.latest_bot_message:
@@ -427,9 +664,8 @@ class ModernChatbotUI(ctk.CTk):
         return "break"
         
     def clear_chat(self, event=None):
-        for widget in self.messages_frame.winfo_children():
-            widget.destroy()
-        self.message_count = 0
+        self.transcript.clear()
+        self.conversation.clear()
         self.add_bot_message("Chat cleared! How can I help you today?")
         
     def toggle_theme(self):
@@ -437,41 +673,65 @@ class ModernChatbotUI(ctk.CTk):
         new_mode = "Dark" if current_mode == "Light" else "Light"
         ctk.set_appearance_mode(new_mode)
         
-    def update_history_list(self):
-        for widget in self.history_frame.winfo_children():
-            widget.destroy()
-            
-        for i, entry in enumerate(reversed(self.history[-10:])):
-            timestamp = datetime.fromisoformat(entry["timestamp"])
-            formatted_time = timestamp.strftime("%H:%M:%S")
-            formatted_date = timestamp.strftime("%b %d")
-            
-            question = entry["question"]
-            if len(question) > 30:
-                question = question[:27] + "..."
-                
-            history_item = ctk.CTkButton(
-                self.history_frame,
-                text=f"{formatted_time} - {question}",
-                font=("Roboto", 12),
-                anchor="w",
-                fg_color="transparent",
-                text_color=self.colors["text_muted"],
-                hover_color=self.colors["bg_dark"],
-                corner_radius=5,
-                height=30,
-                command=lambda q=entry["question"], r=entry["response"]: self.load_history_item(q, r)
-            )
-            history_item.grid(row=i, column=0, sticky="ew", pady=(0, 5))
+    def recent_history(self):
+        return list(reversed(self.history[-PAGE_SIZE:]))
+
+    def load_history_page(self, offset, limit, callback):
+        if offset + limit <= len(self.history) or self.history_store is None:
+            end = max(len(self.history) - offset, 0)
+            callback(list(reversed(self.history[max(end - limit, 0):end])))
+            return
+
+        def worker():
+            # Pages beyond the in-memory window come from the store, which must
+            # have written everything still queued before offsets line up.
+            self.history_store.flush()
+            entries = list(reversed(self.history_store.tail(limit, skip=offset)))
+            self.dispatcher.post(callback, entries)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_search_changed(self, event=None):
+        if self.search_job is not None:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(SEARCH_DEBOUNCE_MS, self.run_search)
+
+    def run_search(self):
+        self.search_job = None
+        query = self.search_entry.get().strip()
+        if query == self.search_query:
+            return
+        self.search_query = query
+        self.search_generation += 1
+        if not query:
+            self.history_list.show_recent(self.recent_history())
+            return
+        generation = self.search_generation
+        if self.history_store is None:
+            # history_loaded() runs the search again once the store is open.
+            return
+        threading.Thread(target=self.search_history, args=(query, generation), daemon=True).start()
+
+    def search_history(self, query, generation):
+        results = self.history_store.search(query, limit=50)
+        self.dispatcher.post(self.show_search_results, results, generation, key="search")
+
+    def show_search_results(self, results, generation):
+        # Drop results from a query the user has already typed past.
+        if generation != self.search_generation:
+            return
+        self.history_list.show_results(results)
             
     def load_history_item(self, question, response):
-        for widget in self.messages_frame.winfo_children():
-            widget.destroy()
-        self.message_count = 0
+        self.transcript.clear()
+        # Follow-ups now continue from the loaded exchange.
+        self.conversation.clear()
+        self.conversation.add(question, response)
             
         self.add_user_message(question)
-        plain_text = self.process_markdown(response)
-        self.add_bot_message(plain_text)
+        segments = render_markdown(response)
+        self.transcript.append("bot", segments=segments)
+        self.latest_bot_message = plain_text(segments)
         
     def navigate_history_up(self, event=None):
         if not self.history:
@@ -0,0 +1,109 @@
+import os
+import re
+
+DEFAULT_BUDGET = 2048
+MESSAGE_OVERHEAD = 4
+MAX_TURNS = 100
+SUMMARY_SHARE = 4
+SUMMARY_QUESTION_CHARS = 100
+SUMMARY_ANSWER_CHARS = 160
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text):
+    """Cheap stand-in for a tokenizer: about four characters per token, at least one per word.
+
+    BPE tokenizers average close to four characters per token on English
+    prose; the word count keeps short-word and code-heavy text from being
+    underestimated. Each message also costs a few tokens of chat framing.
+    """
+    return max(len(text) // 4, len(text.split())) + MESSAGE_OVERHEAD
+
+
+def first_sentence(text, limit):
+    text = " ".join(text.split())
+    match = SENTENCE_END_RE.search(text, 0, limit)
+    if match:
+        return text[:match.start()]
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+class Conversation:
+    """The turns of the current chat, sent back to the server as context.
+
+    window() returns the most recent turns that fit in `budget` estimated
+    tokens, oldest first, so every request carries a bounded amount of
+    history. With `summarize`, turns that no longer fit are condensed into one
+    short system message (the question and the first sentence of each answer)
+    using part of the budget, instead of being dropped outright.
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET, summarize=False):
+        self.budget = budget
+        self.summarize = summarize
+        self.turns = []
+        # Bumped by clear(), so answers to questions from before it can be told apart.
+        self.generation = 0
+
+    @classmethod
+    def from_env(cls):
+        """LLM_CONTEXT_TOKENS sets the history budget (0 turns context off); LLM_SUMMARIZE condenses older turns."""
+        env = os.environ
+        return cls(
+            budget=int(env.get("LLM_CONTEXT_TOKENS", DEFAULT_BUDGET)),
+            summarize=env.get("LLM_SUMMARIZE", "").lower() in ("1", "true", "yes", "on"),
+        )
+
+    def add(self, question, answer):
+        # Token counts are estimated once per turn, not on every window().
+        self.turns.append({
+            "question": question,
+            "answer": answer,
+            "tokens": estimate_tokens(question) + estimate_tokens(answer),
+        })
+        del self.turns[:-MAX_TURNS]
+
+    def clear(self):
+        self.turns = []
+        self.generation += 1
+
+    def window(self):
+        """Chat messages for the turns that fit the budget, oldest first."""
+        if self.budget <= 0:
+            return []
+        summary_budget = self.budget // SUMMARY_SHARE if self.summarize else 0
+        remaining = self.budget - summary_budget
+        start = len(self.turns)
+        while start > 0 and self.turns[start - 1]["tokens"] <= remaining:
+            start -= 1
+            remaining -= self.turns[start]["tokens"]
+
+        messages = []
+        if self.summarize and start > 0:
+            summary = self.summary(self.turns[:start], summary_budget + remaining)
+            if summary:
+                messages.append({"role": "system", "content": summary})
+        for turn in self.turns[start:]:
+            messages.append({"role": "user", "content": turn["question"]})
+            messages.append({"role": "assistant", "content": turn["answer"]})
+        return messages
+
+    def summary(self, turns, budget):
+        """Condense `turns`, newest first, until the summary would exceed `budget` tokens."""
+        header = "Earlier in this conversation:"
+        used = estimate_tokens(header)
+        lines = []
+        for turn in reversed(turns):
+            line = (
+                f"- Asked: {first_sentence(turn['question'], SUMMARY_QUESTION_CHARS)} "
+                f"Answered: {first_sentence(turn['answer'], SUMMARY_ANSWER_CHARS)}"
+            )
+            cost = estimate_tokens(line) - MESSAGE_OVERHEAD
+            if used + cost > budget:
+                break
+            used += cost
+            lines.append(line)
+        if not lines:
+            return None
+        return "\n".join([header] + lines[::-1])
@@ -0,0 +1,66 @@
+import sys
+import threading
+import tkinter as tk
+from collections import OrderedDict
+
+import uiprofiler
+
+# About 30 frames a second: smooth enough for streaming text, cheap when idle.
+PUMP_INTERVAL_MS = 33
+
+
+class Dispatcher:
+    """Runs callbacks posted from any thread on the Tk main thread.
+
+    Tk is not thread-safe, so workers never touch it, not even through
+    after(): post() only adds to a queue under a lock, and one pump on the
+    main thread drains the queue every `interval_ms`. An update posted with
+    a `key` replaces one with the same key that has not run yet and moves to
+    the back of the queue, so a burst of status changes or streamed chunks
+    costs one redraw per frame.
+    """
+
+    def __init__(self, widget, interval_ms=PUMP_INTERVAL_MS):
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self.lock = threading.Lock()
+        self.queue = OrderedDict()
+        self.stopped = False
+        self.job = widget.after(interval_ms, self.pump)
+
+    def post(self, callback, *args, key=None):
+        """Queue callback(*args) for the main thread; safe to call from any thread."""
+        # Unkeyed updates get a key of their own and are never merged.
+        key = key if key is not None else object()
+        with self.lock:
+            self.queue.pop(key, None)
+            self.queue[key] = (callback, args)
+
+    def pump(self):
+        with self.lock:
+            updates = list(self.queue.values())
+            self.queue.clear()
+        # Updates posted while these run wait for the next frame.
+        for callback, args in updates:
+            if self.stopped:
+                return
+            if uiprofiler.active is None:
+                self.run(callback, args)
+            else:
+                # Timed one by one, or all of them would be put down to Dispatcher.pump.
+                uiprofiler.timed(uiprofiler.handler_name(callback), self.run, callback, args)
+        if not self.stopped:
+            self.job = self.widget.after(self.interval_ms, self.pump)
+
+    def run(self, callback, args):
+        try:
+            callback(*args)
+        except Exception:
+            self.widget.report_callback_exception(*sys.exc_info())
+
+    def stop(self):
+        self.stopped = True
+        try:
+            self.widget.after_cancel(self.job)
+        except tk.TclError:
+            pass
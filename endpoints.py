@@ -0,0 +1,97 @@
+import threading
+import time
+
+LATENCY_WEIGHT = 0.3
+DEFAULT_LATENCY = 1.0
+BASE_COOLDOWN = 2
+MAX_COOLDOWN = 60
+
+
+def parse_urls(base_url):
+    """Accept one URL, a comma-separated string of them, or a list."""
+    if isinstance(base_url, str):
+        base_url = base_url.split(",")
+    urls = [url.strip().rstrip("/") for url in base_url if url.strip()]
+    if not urls:
+        raise ValueError("No server URL given")
+    return urls
+
+
+class Endpoint:
+    """One inference node: requests in flight, smoothed latency and whether it is usable."""
+
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.latency = None
+        self.failures = 0
+        self.down_until = 0.0
+
+    def is_up(self, now):
+        return now >= self.down_until
+
+    def __repr__(self):
+        return f"Endpoint({self.url!r})"
+
+
+class EndpointPool:
+    """Spreads requests over several servers, preferring idle and fast ones.
+
+    Each request goes to the usable endpoint with the lowest
+    (outstanding + 1) * latency, where latency is a moving average of time to
+    first byte. A failing endpoint is benched for a cooldown that doubles with
+    every consecutive failure; after that it gets traffic again, and a
+    successful health probe brings it back at once.
+    """
+
+    def __init__(self, urls):
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def score(self, endpoint, fallback_latency):
+        latency = endpoint.latency if endpoint.latency is not None else fallback_latency
+        return (endpoint.outstanding + 1) * latency
+
+    def acquire(self, exclude=()):
+        """Pick an endpoint for a request and count it as outstanding; None if all are excluded."""
+        now = time.monotonic()
+        with self.lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+            # When every node is benched, still try the one that comes back soonest.
+            usable = [e for e in candidates if e.is_up(now)] or [min(candidates, key=lambda e: e.down_until)]
+            known = [e.latency for e in usable if e.latency is not None]
+            # Untried endpoints are assumed to be as fast as the average, so they get a turn.
+            fallback = sum(known) / len(known) if known else DEFAULT_LATENCY
+            endpoint = min(usable, key=lambda e: self.score(e, fallback))
+            endpoint.outstanding += 1
+            return endpoint
+
+    def release(self, endpoint):
+        with self.lock:
+            endpoint.outstanding -= 1
+
+    def record_success(self, endpoint, latency=None):
+        with self.lock:
+            endpoint.failures = 0
+            endpoint.down_until = 0.0
+            if latency is not None:
+                if endpoint.latency is None:
+                    endpoint.latency = latency
+                else:
+                    endpoint.latency += LATENCY_WEIGHT * (latency - endpoint.latency)
+
+    def record_failure(self, endpoint):
+        with self.lock:
+            endpoint.failures += 1
+            cooldown = min(BASE_COOLDOWN * 2 ** (endpoint.failures - 1), MAX_COOLDOWN)
+            endpoint.down_until = time.monotonic() + cooldown
+
+    def up_count(self):
+        now = time.monotonic()
+        with self.lock:
+            return sum(e.is_up(now) for e in self.endpoints)
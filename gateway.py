@@ -0,0 +1,365 @@
+import argparse
+import gzip
+import json
+import math
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from scheduler import RequestHandle
+from transport import Transport
+
+DEFAULT_MAX_BATCH = 8
+DEFAULT_MAX_WAIT = 0.02
+DEFAULT_MAX_INFLIGHT = 32
+DEFAULT_RATE = 1.0
+DEFAULT_BURST = 5
+HEALTH_TTL = 2.0
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average, in bursts of up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Spend a token; return 0, or the seconds until the next one if there is none."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class Batcher:
+    """Gathers questions into micro-batches and forwards each batch upstream together.
+
+    A batch closes once it holds `max_batch` questions or `max_wait` seconds
+    after its first one arrived. It is filled round-robin over clients, so one
+    client's burst cannot crowd the others out. Neither upstream protocol
+    takes several questions in one request, so a batch goes out as concurrent
+    requests over the transport's keep-alive pool: they reach the server at
+    the same moment, where its own batching (vLLM, llama.cpp) can run them in
+    one forward pass, and identical questions are sent only once. At most
+    `max_inflight` questions are upstream at a time; a batch is only formed
+    from free slots, so the rest keep waiting in their clients' queues, where
+    round-robin still applies.
+    """
+
+    def __init__(
+        self, transport, max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT, max_inflight=DEFAULT_MAX_INFLIGHT
+    ):
+        self.transport = transport
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="upstream")
+        self.slots = threading.Semaphore(max_inflight)
+        self.queues = OrderedDict()
+        self.waiting = 0
+        self.cond = threading.Condition()
+        self.batches = 0
+        self.questions = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, client, job):
+        with self.cond:
+            self.queues.setdefault(client, []).append(job)
+            self.waiting += 1
+            self.cond.notify()
+
+    def next_batch(self):
+        """Wait for a free upstream slot and a question, then take one slot per question batched."""
+        self.slots.acquire()
+        with self.cond:
+            while not self.waiting:
+                self.cond.wait()
+            deadline = time.monotonic() + self.max_wait
+            while self.waiting < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            size = 1
+            while size < min(self.max_batch, self.waiting) and self.slots.acquire(blocking=False):
+                size += 1
+            batch = []
+            while self.queues and len(batch) < size:
+                client, jobs = next(iter(self.queues.items()))
+                batch.append(jobs.pop(0))
+                if jobs:
+                    self.queues.move_to_end(client)
+                else:
+                    del self.queues[client]
+            self.waiting -= len(batch)
+            self.batches += 1
+            self.questions += len(batch)
+            return batch
+
+    def run(self):
+        while True:
+            for job in self.next_batch():
+                self.executor.submit(self.forward, job)
+
+    def forward(self, job):
+        events = job["events"]
+        on_token = (lambda token: events.put(("token", token))) if job["stream"] else None
+        try:
+            data = self.transport.ask(job["question"], on_token=on_token, handle=job["handle"], history=job["history"])
+        except Exception as e:
+            # Whatever went wrong, the handler waiting on `events` must hear of it.
+            data = {"error": f"Upstream request failed: {e}"}
+        finally:
+            self.slots.release()
+        events.put(("done", data))
+
+    def stats(self):
+        with self.cond:
+            return {
+                "batches": self.batches,
+                "questions": self.questions,
+                "mean_batch": self.questions / self.batches if self.batches else None,
+                "waiting": self.waiting,
+            }
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    """Serves the Diamond /ask and /health contract in front of the real server."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "LLMGateway/1.0"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if self.path == "/health":
+            if self.server.upstream_up():
+                self.send_json({"status": "ok", "gateway": self.server.batcher.stats()})
+            else:
+                self.send_json({"status": "unavailable", "error": "Upstream server is not answering"}, status=503)
+        else:
+            self.send_json({"error": f"No route for {self.path}"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            data = self.rfile.read(length)
+            if self.headers.get("Content-Encoding") == "gzip":
+                data = gzip.decompress(data)
+            body = json.loads(data or b"{}")
+        except (ValueError, OSError):
+            self.send_json({"error": "Request body is not JSON"}, status=400)
+            return
+        if self.path != "/ask":
+            self.send_json({"error": f"No route for {self.path}"}, status=404)
+            return
+        if not isinstance(body, dict):
+            self.send_json({"error": "Request body must be a JSON object"}, status=400)
+            return
+        if not isinstance(body.get("question"), str) or not body["question"]:
+            self.send_json({"error": "No question given"}, status=400)
+            return
+        if not isinstance(body.get("history") or [], list):
+            self.send_json({"error": "history must be a list of messages"}, status=400)
+            return
+
+        client = self.client_address[0]
+        # Only a trusted proxy may say which of the users behind it is asking; anyone
+        # else could name a fresh client on every request and never be limited.
+        if client in self.server.trusted_proxies and self.headers.get("X-Client-Id"):
+            client = f"{client}/{self.headers['X-Client-Id']}"
+        wait = self.server.admit(client)
+        if wait:
+            self.send_json({"error": "Too many requests"}, status=429, headers={"Retry-After": str(math.ceil(wait))})
+            return
+
+        job = {
+            "question": body["question"],
+            "history": body.get("history") or None,
+            "stream": bool(body.get("stream")),
+            "handle": RequestHandle(self.server.upstream),
+            "events": queue.Queue(),
+        }
+        self.server.batcher.submit(client, job)
+        try:
+            if job["stream"]:
+                self.relay_stream(job)
+            else:
+                self.send_json(self.wait_for_answer(job))
+        except (BrokenPipeError, ConnectionResetError):
+            # The caller went away; stop generating for it unless others asked the same.
+            job["handle"].cancel()
+            self.close_connection = True
+
+    def wait_for_answer(self, job):
+        while True:
+            kind, data = job["events"].get()
+            if kind == "done":
+                return data
+
+    def relay_stream(self, job):
+        self.start_stream()
+        while True:
+            kind, data = job["events"].get()
+            if kind == "token":
+                self.send_chunk({"token": data})
+                continue
+            if "error" in data:
+                self.send_chunk({"error": data["error"], "done": True})
+            else:
+                self.send_chunk({"done": True, "metadata": data.get("metadata")})
+            break
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def send_json(self, data, status=200, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def send_chunk(self, event):
+        data = (json.dumps(event) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class Gateway(ThreadingHTTPServer):
+    """HTTP front end that batches questions for `transport` and rate-limits each client."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        transport,
+        max_batch=DEFAULT_MAX_BATCH,
+        max_wait=DEFAULT_MAX_WAIT,
+        max_inflight=DEFAULT_MAX_INFLIGHT,
+        rate=DEFAULT_RATE,
+        burst=DEFAULT_BURST,
+        trusted_proxies=(),
+        health_ttl=HEALTH_TTL,
+        quiet=False,
+    ):
+        super().__init__(address, GatewayHandler)
+        self.transport = transport
+        self.upstream = transport.base_url
+        self.batcher = Batcher(transport, max_batch, max_wait, max_inflight)
+        self.rate = rate
+        self.burst = burst
+        self.trusted_proxies = set(trusted_proxies)
+        self.buckets = {}
+        self.buckets_lock = threading.Lock()
+        self.pruned_at = time.monotonic()
+        self.health_ttl = health_ttl
+        self.health_lock = threading.Lock()
+        self.health_checked = None
+        self.healthy = False
+        self.quiet = quiet
+
+    def admit(self, client):
+        """0 if `client` may ask now, else the seconds it should wait (rate <= 0 turns limits off)."""
+        if self.rate <= 0:
+            return 0
+        with self.buckets_lock:
+            self.prune_buckets()
+            bucket = self.buckets.get(client)
+            if bucket is None:
+                bucket = self.buckets[client] = TokenBucket(self.rate, self.burst)
+            return bucket.take()
+
+    def prune_buckets(self):
+        """Forget clients idle long enough for their bucket to be full again; a new one is the same."""
+        refill = self.burst / self.rate
+        now = time.monotonic()
+        if now - self.pruned_at < refill:
+            return
+        self.pruned_at = now
+        self.buckets = {client: b for client, b in self.buckets.items() if now - b.updated < refill}
+
+    def upstream_up(self):
+        """Probe upstream at most once per `health_ttl`; concurrent callers share one probe."""
+        with self.health_lock:
+            if self.health_checked is None or time.monotonic() - self.health_checked >= self.health_ttl:
+                try:
+                    self.transport.health()
+                    self.healthy = True
+                except requests.exceptions.RequestException:
+                    self.healthy = False
+                self.health_checked = time.monotonic()
+            return self.healthy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Batching, rate-limiting gateway in front of the LLM server (LLM_SERVER_URL, LLM_BACKEND)."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help="questions per batch")
+    parser.add_argument("--max-wait", type=float, default=DEFAULT_MAX_WAIT, help="seconds a batch stays open")
+    parser.add_argument("--max-inflight", type=int, default=DEFAULT_MAX_INFLIGHT, help="upstream requests at once")
+    parser.add_argument(
+        "--rate", type=float, default=DEFAULT_RATE, help="questions per second per client (0: no limit)"
+    )
+    parser.add_argument("--burst", type=int, default=DEFAULT_BURST, help="questions a client may send at once")
+    parser.add_argument(
+        "--trusted-proxy",
+        action="append",
+        default=[],
+        metavar="ADDRESS",
+        help="proxy whose X-Client-Id header names the client (repeatable)",
+    )
+    parser.add_argument("--timeout", type=float, default=120, help="upstream read timeout in seconds")
+    parser.add_argument("--quiet", action="store_true", help="do not log requests")
+    args = parser.parse_args(argv)
+
+    transport = Transport.from_env(read_timeout=args.timeout, pool_size=args.max_inflight)
+    server = Gateway(
+        (args.host, args.port),
+        transport,
+        max_batch=args.max_batch,
+        max_wait=args.max_wait,
+        max_inflight=args.max_inflight,
+        rate=args.rate,
+        burst=args.burst,
+        trusted_proxies=args.trusted_proxy,
+        quiet=args.quiet,
+    )
+    print(f"Gateway on http://{args.host}:{args.port} -> {transport.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        transport.close()
+
+
+if __name__ == "__main__":
+    main()
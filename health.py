@@ -0,0 +1,98 @@
+import random
+import threading
+import time
+
+import requests
+
+
+class HealthMonitor:
+    """Probes /health on a background thread and caches the result for the UI.
+
+    Readers only ever look at the cached state. Probes back off exponentially
+    while the server is down, and any successful /ask counts as a probe so a
+    busy, healthy server is not checked redundantly.
+    """
+
+    def __init__(self, transport, on_change=None, interval=15, stale_after=30, max_backoff=120):
+        self.transport = transport
+        self.on_change = on_change
+        self.interval = interval
+        self.stale_after = stale_after
+        self.max_backoff = max_backoff
+
+        self.connected = False
+        self.last_checked = None
+        self.failures = 0
+        self.forced = False
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+    def is_stale(self):
+        with self.lock:
+            return self.last_checked is None or time.monotonic() - self.last_checked > self.stale_after
+
+    def is_known_down(self):
+        """True only when the last check is fresh and it failed."""
+        return not self.connected and not self.is_stale()
+
+    def refresh(self):
+        """Ask for an early probe without waiting for it."""
+        with self.lock:
+            self.forced = True
+        self.wake.set()
+
+    def next_delay(self):
+        if self.failures == 0:
+            return self.interval
+        # Jitter keeps many clients watching the same recovering server from probing in step.
+        delay = min(2 ** self.failures, self.max_backoff)
+        return random.uniform(delay / 2, delay)
+
+    def time_until_due(self):
+        with self.lock:
+            if self.forced or self.last_checked is None:
+                return 0
+            elapsed = time.monotonic() - self.last_checked
+            return max(self.next_delay() - elapsed, 0)
+
+    def run(self):
+        while not self.stopped.is_set():
+            delay = self.time_until_due()
+            if delay > 0:
+                self.wake.wait(delay)
+                self.wake.clear()
+                continue
+            self.probe()
+
+    def probe(self):
+        with self.lock:
+            self.forced = False
+        try:
+            self.transport.health()
+            self.record_success()
+        except requests.exceptions.RequestException:
+            self.record_failure()
+
+    def record_success(self):
+        self.record(True)
+
+    def record_failure(self):
+        self.record(False)
+
+    def record(self, ok):
+        with self.lock:
+            changed = ok != self.connected or self.last_checked is None
+            self.connected = ok
+            self.failures = 0 if ok else self.failures + 1
+            self.last_checked = time.monotonic()
+        if changed and self.on_change:
+            self.on_change(ok)
@@ -0,0 +1,413 @@
+import collections
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+READ_BLOCK_SIZE = 64 * 1024
+ENTRY_FIELDS = ("timestamp", "question", "response")
+
+
+def decode_line(line):
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    return entry if isinstance(entry, dict) else None
+
+
+def read_jsonl(path):
+    """Yield the readable entries of a JSONL file, oldest first, one line at a time."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        for line in f:
+            entry = decode_line(line)
+            if entry is not None:
+                yield entry
+
+
+class JsonlHistoryStore:
+    """Append-only chat history kept as one JSON object per line.
+
+    Appends are queued and written by a background thread, which fsyncs in
+    batches and periodically compacts the file. A line torn by a crash is
+    truncated away on the next open, and compaction rewrites through a
+    temporary file so the log is never left half-written.
+    """
+
+    def __init__(
+        self,
+        path="chatbot_logs.jsonl",
+        legacy_path="chatbot_logs.json",
+        fsync_every=20,
+        fsync_interval=1.0,
+        compact_every=1000,
+        max_entries=None,
+    ):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.max_entries = max_entries
+
+        self.recover()
+        if not os.path.exists(self.path) and legacy_path and os.path.exists(legacy_path):
+            self.migrate(legacy_path)
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def recover(self):
+        """Drop a trailing partial line left behind by an interrupted write."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            pos = end
+            while pos > 0:
+                size = min(READ_BLOCK_SIZE, pos)
+                f.seek(pos - size)
+                block = f.read(size)
+                newline = block.rfind(b"\n")
+                if newline != -1:
+                    pos = pos - size + newline + 1
+                    break
+                pos -= size
+            if pos != end:
+                f.truncate(pos)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def migrate(self, legacy_path):
+        try:
+            with open(legacy_path, "r") as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        if isinstance(entries, list):
+            self.rewrite([entry for entry in entries if isinstance(entry, dict)])
+
+    def append(self, entry):
+        self.queue.put(entry)
+
+    def flush(self):
+        """Block until every queued entry has been written."""
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def run(self):
+        f = None
+        unsynced = 0
+        last_sync = time.monotonic()
+        since_compaction = 0
+        while True:
+            try:
+                entry = self.queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                if unsynced:
+                    try:
+                        os.fsync(f.fileno())
+                    except OSError as e:
+                        self.report(e)
+                    unsynced = 0
+                    last_sync = time.monotonic()
+                continue
+
+            # A failed write (disk full, say) loses that entry but never the writer,
+            # and every entry is marked done so flush() and close() cannot hang.
+            try:
+                if entry is None:
+                    if f is not None:
+                        if unsynced:
+                            os.fsync(f.fileno())
+                        f.close()
+                    return
+                if f is None:
+                    f = open(self.path, "a", encoding="utf-8")
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                unsynced += 1
+                since_compaction += 1
+                if unsynced >= self.fsync_every or time.monotonic() - last_sync >= self.fsync_interval:
+                    os.fsync(f.fileno())
+                    unsynced = 0
+                    last_sync = time.monotonic()
+                if since_compaction >= self.compact_every:
+                    f.close()
+                    f = None
+                    since_compaction = 0
+                    self.compact()
+            except OSError as e:
+                self.report(e)
+                # Reopened for the next entry, in case the handle itself went bad.
+                if f is not None:
+                    try:
+                        f.close()
+                    except OSError:
+                        pass
+                    f = None
+                unsynced = 0
+            finally:
+                self.queue.task_done()
+
+    def report(self, error):
+        print(f"Could not write history to {self.path}: {error}", file=sys.stderr)
+
+    def compact(self):
+        """Rewrite the log without unreadable lines and beyond max_entries."""
+        entries = []
+        dropped = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                entry = decode_line(line)
+                if entry is None:
+                    if line.strip():
+                        dropped += 1
+                    continue
+                entries.append(entry)
+        if self.max_entries is not None and len(entries) > self.max_entries:
+            dropped += len(entries) - self.max_entries
+            entries = entries[-self.max_entries:]
+        if dropped:
+            self.rewrite(entries)
+
+    def rewrite(self, entries):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def iter_entries(self):
+        """Yield entries oldest first without loading the whole file."""
+        return read_jsonl(self.path)
+
+    def tail(self, limit, skip=0):
+        """Return up to `limit` entries before the newest `skip`, oldest first, reading from the end."""
+        if not os.path.exists(self.path):
+            return []
+        limit += skip
+        entries = []
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            remainder = b""
+            while pos > 0 and len(entries) < limit:
+                size = min(READ_BLOCK_SIZE, pos)
+                pos -= size
+                f.seek(pos)
+                lines = (f.read(size) + remainder).split(b"\n")
+                remainder = lines[0]
+                for line in reversed(lines[1:]):
+                    entry = decode_line(line)
+                    if entry is not None:
+                        entries.append(entry)
+                        if len(entries) == limit:
+                            break
+            if pos == 0 and len(entries) < limit:
+                entry = decode_line(remainder)
+                if entry is not None:
+                    entries.append(entry)
+        entries = entries[skip:]
+        entries.reverse()
+        return entries
+
+    def search(self, query, limit=50):
+        """Return the newest entries whose question or response contains every word of `query`."""
+        words = query.lower().split()
+        matches = collections.deque(maxlen=limit)
+        for entry in self.iter_entries():
+            text = f"{entry.get('question', '')}\n{entry.get('response', '')}".lower()
+            if all(word in text for word in words):
+                matches.append(entry)
+        return list(reversed(matches))
+
+
+class SqliteHistoryStore:
+    """Chat history in SQLite with an FTS5 index over questions and responses.
+
+    Writes go through a background thread that commits in batches; every
+    reading thread gets its own connection, so searches never wait on the
+    writer (the database runs in WAL mode). Falls back to LIKE queries when
+    the SQLite build lacks FTS5.
+    """
+
+    def __init__(self, path="chatbot_logs.db", import_path="chatbot_logs.jsonl", commit_every=20, commit_interval=1.0):
+        self.path = path
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.local = threading.local()
+
+        conn = self.connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, question TEXT NOT NULL, "
+            "response TEXT NOT NULL, extra TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS history_timestamp ON history(timestamp)")
+        try:
+            conn.executescript(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                    question, response, content='history', content_rowid='id'
+                );
+                CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+                    INSERT INTO history_fts(rowid, question, response)
+                    VALUES (new.id, new.question, new.response);
+                END;
+                CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN
+                    INSERT INTO history_fts(history_fts, rowid, question, response)
+                    VALUES ('delete', old.id, old.question, old.response);
+                END;
+                """
+            )
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        conn.commit()
+
+        empty = conn.execute("SELECT 1 FROM history LIMIT 1").fetchone() is None
+        if empty and import_path and os.path.exists(import_path):
+            self.insert(conn, read_jsonl(import_path))
+            conn.commit()
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.row_factory = sqlite3.Row
+            self.local.conn = conn
+        return conn
+
+    def insert(self, conn, entries):
+        rows = []
+        for entry in entries:
+            extra = {key: value for key, value in entry.items() if key not in ENTRY_FIELDS}
+            rows.append((
+                entry.get("timestamp", ""),
+                entry.get("question", ""),
+                str(entry.get("response", "")),
+                json.dumps(extra, ensure_ascii=False) if extra else None,
+            ))
+        conn.executemany(
+            "INSERT INTO history (timestamp, question, response, extra) VALUES (?, ?, ?, ?)", rows
+        )
+
+    def append(self, entry):
+        self.queue.put(entry)
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def run(self):
+        conn = sqlite3.connect(self.path)
+        batch = []
+        last_commit = time.monotonic()
+        while True:
+            try:
+                entry = self.queue.get(timeout=self.commit_interval)
+            except queue.Empty:
+                self.commit(conn, batch)
+                batch = []
+                last_commit = time.monotonic()
+                continue
+
+            if entry is None:
+                self.commit(conn, batch)
+                self.queue.task_done()
+                conn.close()
+                return
+
+            batch.append(entry)
+            if len(batch) >= self.commit_every or time.monotonic() - last_commit >= self.commit_interval:
+                self.commit(conn, batch)
+                batch = []
+                last_commit = time.monotonic()
+
+    def commit(self, conn, batch):
+        if not batch:
+            return
+        # A failed batch (disk full, database locked) is lost, but the writer carries
+        # on and the entries are marked done so flush() and close() cannot hang.
+        try:
+            with conn:
+                self.insert(conn, batch)
+        except sqlite3.Error as e:
+            print(f"Could not write history to {self.path}: {e}", file=sys.stderr)
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+
+    def entry(self, row):
+        entry = {"timestamp": row["timestamp"], "question": row["question"], "response": row["response"]}
+        if row["extra"]:
+            entry.update(json.loads(row["extra"]))
+        return entry
+
+    def iter_entries(self):
+        cursor = self.connect().execute("SELECT * FROM history ORDER BY id")
+        for row in cursor:
+            yield self.entry(row)
+
+    def tail(self, limit, skip=0):
+        rows = self.connect().execute(
+            "SELECT * FROM history ORDER BY id DESC LIMIT ? OFFSET ?", (limit, skip)
+        ).fetchall()
+        return [self.entry(row) for row in reversed(rows)]
+
+    def search(self, query, limit=50):
+        """Return the newest entries matching every word of `query`, newest first."""
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        conn = self.connect()
+        if self.fts:
+            # Quote each word so user input can never be parsed as FTS5 syntax.
+            match = " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+            # FTS5 walks rowids in descending order itself, so LIMIT stops the scan early.
+            rows = conn.execute(
+                "SELECT history.* FROM history JOIN ("
+                "SELECT rowid FROM history_fts WHERE history_fts MATCH ? ORDER BY rowid DESC LIMIT ?"
+                ") AS hits ON history.id = hits.rowid ORDER BY history.id DESC",
+                (match, limit),
+            ).fetchall()
+        else:
+            clauses = " AND ".join("(question LIKE ? OR response LIKE ?)" for _ in words)
+            params = []
+            for word in words:
+                params += [f"%{word}%", f"%{word}%"]
+            rows = conn.execute(
+                f"SELECT * FROM history WHERE {clauses} ORDER BY id DESC LIMIT ?", params + [limit]
+            ).fetchall()
+        return [self.entry(row) for row in rows]
+
+
+def open_history_store():
+    """Pick the history backend named by LLM_HISTORY_BACKEND ("jsonl" or "sqlite")."""
+    if os.environ.get("LLM_HISTORY_BACKEND", "jsonl").lower() == "sqlite":
+        return SqliteHistoryStore()
+    return JsonlHistoryStore()
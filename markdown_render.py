@@ -0,0 +1,198 @@
+import re
+import webbrowser
+
+HEADER_RE = re.compile(r"(#{1,6})\s+")
+BULLET_RE = re.compile(r"(\s*)[-*+]\s+")
+RULE_RE = re.compile(r"\s*([-*_])(\s*\1){2,}\s*$")
+
+HEADER_TAGS = {1: "h1", 2: "h2", 3: "h3"}
+MAX_URL_LENGTH = 2048
+
+
+class InlineScanner:
+    """Splits one line into (text, tags) segments for bold, italic, code and links.
+
+    Every search for a closing marker is memoized by marker, so a line full of
+    unmatched openers is still scanned once: the running time is linear in the
+    length of the line, with no regex backtracking.
+    """
+
+    def __init__(self, line):
+        self.line = line
+        self.next_found = {}
+        self.parens = None
+
+    def find(self, marker, start):
+        found = self.next_found.get(marker)
+        # An earlier search from a smaller start stays valid until we pass its hit.
+        if found is not None and (found == -1 or found >= start):
+            return found
+        found = self.line.find(marker, start)
+        self.next_found[marker] = found
+        return found
+
+    def link_end(self, start):
+        """Index just past the ")" closing a link target starting at `start`, or -1."""
+        if self.parens is None:
+            # Pair every bracket in one pass, so each link lookup is a dict hit.
+            self.parens = {}
+            opened = []
+            for i, char in enumerate(self.line):
+                if char == "(":
+                    opened.append(i)
+                elif char == ")" and opened:
+                    self.parens[opened.pop()] = i
+        close = self.parens.get(start - 1)
+        if close is None or close - start > MAX_URL_LENGTH:
+            return -1
+        return close + 1
+
+    def scan(self, start, stop, tags):
+        segments = []
+        plain_start = start
+        i = start
+        line = self.line
+        while i < stop:
+            char = line[i]
+            span = None
+            if char == "`":
+                close = self.find("`", i + 1)
+                if i + 1 < close < stop:
+                    span = (close + 1, [(line[i + 1:close], tags + ("code",))])
+            elif char == "*" and line.startswith("**", i):
+                close = self.find("**", i + 2)
+                if i + 2 < close and close + 2 <= stop:
+                    span = (close + 2, self.scan(i + 2, close, tags + ("bold",)))
+                else:
+                    i += 1
+            elif (
+                char in "*_"
+                and i + 1 < stop
+                and not line[i + 1].isspace()
+                and not (char == "_" and i > 0 and line[i - 1].isalnum())
+            ):
+                close = self.find(char, i + 1)
+                if i + 1 < close < stop:
+                    span = (close + 1, self.scan(i + 1, close, tags + ("italic",)))
+            elif char == "[":
+                close = self.find("](", i + 1)
+                if close != -1 and close < stop:
+                    end = self.link_end(close + 2)
+                    if end != -1 and end <= stop:
+                        url = line[close + 2:end - 1].strip()
+                        span = (end, self.scan(i + 1, close, tags + ("link", "href:" + url)))
+
+            if span is None:
+                i += 1
+                continue
+            if plain_start < i:
+                segments.append((line[plain_start:i], tags))
+            i, inner = span
+            segments.extend(inner)
+            plain_start = i
+        if plain_start < stop:
+            segments.append((line[plain_start:stop], tags))
+        return segments
+
+
+def render_inline(line, tags=()):
+    return InlineScanner(line).scan(0, len(line), tags)
+
+
+class MarkdownStream:
+    """Incremental markdown renderer producing (text, tags) segments.
+
+    feed() renders every line completed by the new chunk and keeps the partial
+    last line in `pending` (callers show it raw until it completes); close()
+    renders what is left. Code fences are tracked across chunks.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.in_code = False
+
+    @property
+    def pending(self):
+        return "".join(self.parts)
+
+    def feed(self, chunk):
+        if "\n" not in chunk:
+            self.parts.append(chunk)
+            return []
+        head, _, rest = chunk.rpartition("\n")
+        text = "".join(self.parts) + head
+        self.parts = [rest] if rest else []
+        segments = []
+        for line in text.split("\n"):
+            segments.extend(self.render_line(line, final=False))
+        return segments
+
+    def close(self):
+        text = self.pending
+        self.parts = []
+        if not text:
+            return []
+        return self.render_line(text, final=True)
+
+    def render_line(self, line, final):
+        newline = [] if final else [("\n", ("code_block",) if self.in_code else ())]
+        if line.lstrip().startswith("```"):
+            self.in_code = not self.in_code
+            return []
+        if self.in_code:
+            return [(line, ("code_block",))] + newline
+
+        match = HEADER_RE.match(line)
+        if match:
+            tag = HEADER_TAGS.get(len(match.group(1)), "h3")
+            return render_inline(line[match.end():], (tag,)) + newline
+        if RULE_RE.match(line):
+            return [("─" * 24, ("rule",))] + newline
+        match = BULLET_RE.match(line)
+        if match:
+            bullet = [(match.group(1) + "• ", ("list",))]
+            return bullet + render_inline(line[match.end():], ("list",)) + newline
+        if line.startswith(">"):
+            return render_inline(line[1:].lstrip(), ("quote",)) + newline
+        return render_inline(line) + newline
+
+
+def render_markdown(text):
+    stream = MarkdownStream()
+    return stream.feed(text) + stream.close()
+
+
+def plain_text(segments):
+    return "".join(text for text, _ in segments)
+
+
+def configure_tags(widget, colors, family="Roboto", size=14):
+    """Define the tags render_markdown emits on a Tk Text widget."""
+    mono = ("Courier", size - 1)
+    widget.tag_configure("bold", font=(family, size, "bold"))
+    widget.tag_configure("italic", font=(family, size, "italic"))
+    widget.tag_configure("code", font=mono, background=colors["code_bg"])
+    widget.tag_configure("code_block", font=mono, background=colors["code_bg"], lmargin1=10, lmargin2=10)
+    widget.tag_configure("h3", font=(family, size + 1, "bold"))
+    widget.tag_configure("h2", font=(family, size + 3, "bold"))
+    widget.tag_configure("h1", font=(family, size + 5, "bold"))
+    widget.tag_configure("list", lmargin1=10, lmargin2=26)
+    widget.tag_configure("quote", foreground=colors["text_muted"], lmargin1=15, lmargin2=15)
+    widget.tag_configure("rule", foreground=colors["text_muted"])
+    widget.tag_configure("link", foreground=colors["link"], underline=True)
+    cursor = widget.cget("cursor")
+    widget.tag_bind("link", "<Enter>", lambda e: widget.configure(cursor="hand2"))
+    widget.tag_bind("link", "<Leave>", lambda e: widget.configure(cursor=cursor))
+    widget.tag_bind("link", "<Button-1>", lambda e: open_link(widget))
+
+
+def open_link(widget):
+    for tag in widget.tag_names("current"):
+        if tag.startswith("href:"):
+            webbrowser.open(tag[5:])
+            return
+
+
+def insert_segments(widget, index, segments):
+    for text, tags in segments:
+        widget.insert(index, text, tags)
@@ -0,0 +1,248 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+WINDOW = 1000
+EXPORT_INTERVAL = 5
+QUANTILES = (0.5, 0.95, 0.99)
+TIMINGS = ("connect_ms", "ttfb_ms", "ttft_ms", "total_ms")
+
+# Connections are opened on the thread that sends the request, so a thread-local
+# is enough to hand the time spent connecting back to that request.
+connect_times = threading.local()
+
+
+def take_connect_ms():
+    """Milliseconds this thread spent on DNS and TCP/TLS setup since the last call."""
+    ms = getattr(connect_times, "ms", 0.0)
+    connect_times.ms = 0.0
+    return ms
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        connect_times.ms = getattr(connect_times, "ms", 0.0) + (time.perf_counter() - start) * 1000
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        connect_times.ms = getattr(connect_times, "ms", 0.0) + (time.perf_counter() - start) * 1000
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections report how long they took to open (see take_connect_ms)."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+def new_sample(kind):
+    """Start timing one logical request (all of its retries included)."""
+    return {
+        "kind": kind,
+        "timestamp": time.time(),
+        "start": time.perf_counter(),
+        "endpoint": None,
+        "status": None,
+        "connect_ms": 0.0,
+        "ttfb_ms": None,
+        "ttft_ms": None,
+        "total_ms": None,
+        "request_bytes": 0,
+        "response_bytes": 0,
+        "wire_bytes": None,
+        "encoding": None,
+        "attempts": 0,
+        "error": None,
+    }
+
+
+def elapsed_ms(sample):
+    return (time.perf_counter() - sample["start"]) * 1000
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class Metrics:
+    """Client-observed timings for every request, as rolling windows per kind ("ask", "health").
+
+    Each sample records connect time (DNS and TCP/TLS, 0 on a reused
+    keep-alive connection), time to response headers of the last attempt
+    (ttfb), time to the first streamed token and total time (both from the
+    first attempt, as the user sees them), bytes sent and received, and
+    retries. Received bytes are counted after decompression; `wire_bytes` is
+    the size on the wire when the server sent a Content-Length. Percentiles
+    cover the last `window` successful samples.
+
+    With `path`, samples are also exported: one JSON line per request, or a
+    Prometheus text file rewritten every few seconds if the name ends in .prom.
+    """
+
+    def __init__(self, path=None, window=WINDOW, export_interval=EXPORT_INTERVAL):
+        self.window = window
+        self.export_interval = export_interval
+        self.samples = {}
+        self.totals = {}
+        self.lock = threading.Lock()
+        self.export_lock = threading.Lock()
+
+        self.path = path
+        self.prometheus_file = bool(path) and path.endswith(".prom")
+        self.exported_at = 0.0
+        self.output = None
+        if path and not self.prometheus_file:
+            self.output = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def from_env(cls):
+        return cls(path=os.environ.get("LLM_METRICS_FILE") or None)
+
+    def finish(self, sample, error=None):
+        """Close a sample started with new_sample() and record it."""
+        sample["total_ms"] = round(elapsed_ms(sample), 1)
+        del sample["start"]
+        if error is not None:
+            sample["error"] = str(error)
+        sample["retries"] = max(sample["attempts"] - 1, 0)
+        for field in TIMINGS:
+            if sample[field] is not None:
+                sample[field] = round(sample[field], 1)
+        self.record(sample)
+
+    def record(self, sample):
+        kind = sample["kind"]
+        with self.lock:
+            totals = self.totals.setdefault(
+                kind, {"requests": 0, "errors": 0, "retries": 0, "seconds": 0.0, "bytes_in": 0, "bytes_out": 0}
+            )
+            totals["requests"] += 1
+            totals["retries"] += sample["retries"]
+            totals["seconds"] += sample["total_ms"] / 1000
+            totals["bytes_in"] += sample["response_bytes"]
+            totals["bytes_out"] += sample["request_bytes"]
+            if sample["error"] is not None:
+                totals["errors"] += 1
+            else:
+                self.samples.setdefault(kind, deque(maxlen=self.window)).append(sample)
+            if self.output is not None:
+                try:
+                    self.output.write(json.dumps(sample) + "\n")
+                    self.output.flush()
+                except OSError as e:
+                    # Losing the export must not fail the request it describes.
+                    print(f"Metrics export to {self.path} stopped: {e}", file=sys.stderr)
+                    self.output = None
+        if self.prometheus_file:
+            self.export()
+
+    def percentiles(self, kind="ask", field="total_ms"):
+        with self.lock:
+            values = sorted(s[field] for s in self.samples.get(kind, ()) if s[field] is not None)
+        return {q: percentile(values, q) for q in QUANTILES}
+
+    def counts(self, kind="ask"):
+        with self.lock:
+            return dict(self.totals.get(kind, {}))
+
+    def summary(self, kind="ask"):
+        """A few lines for the stats panel."""
+        totals = self.counts(kind)
+        if not totals:
+            return f"No {kind} requests yet"
+        lines = []
+        for field, label in (("total_ms", "total"), ("ttft_ms", "first token")):
+            p = self.percentiles(kind, field)
+            if p[0.5] is not None:
+                lines.append(
+                    f"{label} p50 {p[0.5] / 1000:.2f}s · p95 {p[0.95] / 1000:.2f}s · p99 {p[0.99] / 1000:.2f}s"
+                )
+        lines.append(f"{totals['requests']} requests · {totals['errors']} failed · {totals['retries']} retries")
+        return "\n".join(lines)
+
+    def prometheus(self):
+        lines = []
+        with self.lock:
+            totals = {kind: dict(t) for kind, t in self.totals.items()}
+        for field in TIMINGS:
+            name = f"llm_client_{field[:-3]}_seconds"
+            lines.append(f"# TYPE {name} summary")
+            for kind in sorted(totals):
+                values = self.percentiles(kind, field)
+                for q, value in values.items():
+                    if value is not None:
+                        lines.append(f'{name}{{kind="{kind}",quantile="{q}"}} {value / 1000:.6f}')
+        for key, kind_name in (
+            ("requests", "requests_total"),
+            ("errors", "errors_total"),
+            ("retries", "retries_total"),
+            ("seconds", "request_seconds_total"),
+            ("bytes_in", "received_bytes_total"),
+            ("bytes_out", "sent_bytes_total"),
+        ):
+            name = f"llm_client_{kind_name}"
+            lines.append(f"# TYPE {name} counter")
+            for kind in sorted(totals):
+                lines.append(f'{name}{{kind="{kind}"}} {totals[kind][key]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, force=False):
+        """Rewrite the Prometheus file if it is due (or `force`); I/O errors are reported, not raised."""
+        # Workers finishing together must not all rewrite it: whoever finds it busy skips.
+        if not self.export_lock.acquire(blocking=force):
+            return
+        try:
+            if force or time.monotonic() - self.exported_at >= self.export_interval:
+                self.exported_at = time.monotonic()
+                self.write_prometheus()
+        except OSError as e:
+            print(f"Could not write metrics to {self.path}: {e}", file=sys.stderr)
+        finally:
+            self.export_lock.release()
+
+    def write_prometheus(self):
+        # Unique per writer, so another process exporting to the same file cannot rename ours away.
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.prometheus())
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def close(self):
+        if self.prometheus_file:
+            self.export(force=True)
+        with self.lock:
+            if self.output is not None:
+                self.output.close()
+                self.output = None
@@ -0,0 +1,95 @@
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+DEFAULT_CONCURRENCY = 2
+
+
+class Outbox:
+    """Questions asked while the server was unreachable, kept on disk until they are answered.
+
+    The queue is a small JSON-lines file, oldest first, rewritten through a
+    temporary file on every change, so questions survive a crash or restart.
+    claim() hands out queued entries in order and at most `concurrency` at a
+    time; an answered entry is removed, and one whose request failed again is
+    released to be sent on the next reconnect.
+    """
+
+    def __init__(self, path="chatbot_outbox.jsonl", concurrency=DEFAULT_CONCURRENCY):
+        self.path = path
+        self.concurrency = concurrency
+        self.lock = threading.Lock()
+        self.sending = set()
+        self.entries = []
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+
+    @classmethod
+    def from_env(cls):
+        """None when LLM_OUTBOX is off; LLM_OUTBOX_FILE and LLM_OUTBOX_CONCURRENCY tune it."""
+        env = os.environ
+        if env.get("LLM_OUTBOX", "1").lower() in ("0", "false", "no", "off"):
+            return None
+        return cls(
+            path=env.get("LLM_OUTBOX_FILE", "chatbot_outbox.jsonl"),
+            concurrency=int(env.get("LLM_OUTBOX_CONCURRENCY", DEFAULT_CONCURRENCY)),
+        )
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def queued(self):
+        """All entries not yet answered, oldest first."""
+        with self.lock:
+            return list(self.entries)
+
+    def add(self, question, history=None):
+        entry = {
+            "id": uuid.uuid4().hex,
+            "timestamp": datetime.now().isoformat(),
+            "question": question,
+            "history": history or [],
+        }
+        with self.lock:
+            self.entries.append(entry)
+            self.save()
+        return entry
+
+    def claim(self):
+        """The oldest entry not already being sent, or None if there is none or enough are in flight."""
+        with self.lock:
+            if len(self.sending) >= self.concurrency:
+                return None
+            for entry in self.entries:
+                if entry["id"] not in self.sending:
+                    self.sending.add(entry["id"])
+                    return entry
+            return None
+
+    def release(self, entry_id):
+        """Keep a claimed entry queued after its request failed."""
+        with self.lock:
+            self.sending.discard(entry_id)
+
+    def remove(self, entry_id):
+        with self.lock:
+            self.sending.discard(entry_id)
+            self.entries = [entry for entry in self.entries if entry["id"] != entry_id]
+            self.save()
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
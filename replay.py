@@ -0,0 +1,141 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from backends import backend_from_env
+from capture import read_capture
+from metrics import Metrics, percentile
+from transport import Transport
+
+FIELDS = (("total_ms", "total"), ("ttft_ms", "first token"), ("ttfb_ms", "headers"))
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def distribution(records):
+    """Latency percentiles and error rate of a capture or of a replay's results."""
+    records = list(records)
+    summary = {"requests": len(records), "errors": sum(1 for r in records if r.get("error"))}
+    for field, _ in FIELDS:
+        values = sorted(r[field] for r in records if r.get(field) is not None and not r.get("error"))
+        summary[field] = {str(q): percentile(values, q) for q in QUANTILES}
+    return summary
+
+
+def replay(records, url, speed, concurrency, timeout, results_path=None):
+    """Ask every captured question again, spaced as captured divided by `speed` (0: at once)."""
+    transport = Transport(
+        url,
+        read_timeout=timeout,
+        pool_size=concurrency,
+        backend=backend_from_env(),
+        metrics=Metrics(path=results_path, window=max(len(records), 1)),
+        # Every captured request is sent, even ones that were identical and concurrent.
+        coalesce=False,
+    )
+    late = []
+    lock = threading.Lock()
+
+    def ask(record, due):
+        if due is not None:
+            with lock:
+                late.append(max(time.perf_counter() - due, 0))
+        on_token = (lambda token: None) if record.get("stream") else None
+        try:
+            transport.ask(record["question"], on_token=on_token, history=record.get("history") or None)
+        except (requests.exceptions.RequestException, ValueError):
+            # Already recorded in the metrics sample.
+            pass
+
+    start = time.perf_counter()
+    first = records[0]["timestamp"] if records else 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for record in records:
+            due = None
+            if speed > 0:
+                due = start + (record["timestamp"] - first) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            executor.submit(ask, record, due)
+    elapsed = time.perf_counter() - start
+    transport.close()
+
+    counts = transport.metrics.counts("ask")
+    summary = distribution(transport.metrics.samples.get("ask", ()))
+    # Failed requests are not kept in the rolling window; take them from the totals.
+    summary["requests"] = counts.get("requests", 0)
+    summary["errors"] = counts.get("errors", 0)
+    summary["elapsed_s"] = elapsed
+    late.sort()
+    summary["start_lag_p95_ms"] = percentile(late, 0.95) * 1000 if late else None
+    return summary
+
+
+def format_ms(value):
+    return "-" if value is None else f"{value:.0f}"
+
+
+def print_comparison(baseline, current):
+    print(f"{'':<12} {'':>5} {'baseline ms':>12} {'replay ms':>12} {'change':>8}")
+    for field, label in FIELDS:
+        for q in QUANTILES:
+            before = baseline[field][str(q)]
+            after = current[field][str(q)]
+            change = f"{after / before - 1:+.0%}" if before and after is not None else "-"
+            name = f"p{int(q * 100)}"
+            print(f"{label:<12} {name:>5} {format_ms(before):>12} {format_ms(after):>12} {change:>8}")
+    for name, summary in (("baseline", baseline), ("replay", current)):
+        rate = summary["errors"] / summary["requests"] if summary["requests"] else 0
+        print(f"{name}: {summary['requests']} requests, {rate:.1%} errors")
+
+
+def regressions(baseline, current, tolerance):
+    found = []
+    for q in ("0.5", "0.95"):
+        before = baseline["total_ms"][q]
+        after = current["total_ms"][q]
+        if before and after is not None and after > before * tolerance:
+            found.append(f"total p{int(float(q) * 100)}: {before:.0f} -> {after:.0f} ms")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Re-send captured /ask traffic (LLM_CAPTURE_FILE) and compare latency with an earlier run."
+    )
+    parser.add_argument("capture", help="capture file written with LLM_CAPTURE_FILE (.jsonl or .jsonl.gz)")
+    parser.add_argument("--url", required=True, help="server to replay against")
+    parser.add_argument("--speed", type=float, default=1.0, help="2 = twice as fast as captured, 0 = all at once")
+    parser.add_argument("-c", "--concurrency", type=int, default=32, help="most requests in flight")
+    parser.add_argument("--timeout", type=float, default=120, help="read timeout per request in seconds")
+    parser.add_argument("--save", help="write this run's samples here, to compare later runs against")
+    parser.add_argument("--baseline", help="capture or --save file to compare with (default: the capture itself)")
+    parser.add_argument("--tolerance", type=float, default=0, help="exit 1 if total p50/p95 got this many times slower")
+    parser.add_argument("--json", action="store_true", help="print the summaries as JSON")
+    args = parser.parse_args(argv)
+
+    records = sorted(read_capture(args.capture), key=lambda record: record["timestamp"])
+    current = replay(records, args.url, args.speed, args.concurrency, args.timeout, args.save)
+    baseline = distribution(read_capture(args.baseline or args.capture))
+
+    if args.json:
+        print(json.dumps({"baseline": baseline, "replay": current}, indent=2))
+    else:
+        print_comparison(baseline, current)
+        lag = current["start_lag_p95_ms"]
+        print(f"replayed in {current['elapsed_s']:.1f}s" + (f", p95 start lag {lag:.0f} ms" if lag is not None else ""))
+    if args.tolerance:
+        found = regressions(baseline, current, args.tolerance)
+        for line in found:
+            print(f"regression: {line}", file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
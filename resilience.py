@@ -0,0 +1,247 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+# Statuses that mean the server did not (or could not) run the request.
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling a server the circuit breaker has given up on for now."""
+
+
+def retry_after(error):
+    """Seconds a 429/503 response asked us to wait, if it said so."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+def is_retryable(error, idempotent):
+    """Whether repeating the request that raised `error` is safe and worthwhile.
+
+    Failures before the request reached the server (refused or timed-out
+    connects) and "try again" statuses are always retryable. Anything that may
+    have happened after the server started work, such as a read timeout or a
+    reset mid-response, is only retried for idempotent requests.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUSES
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        # A connection that was never made (refused, unresolvable) cannot have reached the server.
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return idempotent or isinstance(reason, NewConnectionError)
+    if isinstance(error, requests.exceptions.Timeout):
+        return idempotent
+    return False
+
+
+def is_outage(error):
+    """Whether `error` says something about the server's health, as opposed to the request."""
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code >= 500
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+class RetryBudget:
+    """Caps retries at a fraction of recent traffic so a struggling server is not swamped.
+
+    Every request deposits `ratio` tokens and every retry spends one; the
+    balance never exceeds `max_tokens`, which is also the starting balance.
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """Stops calls to a server after `threshold` consecutive outage failures.
+
+    While open, calls fail at once with CircuitOpenError. After `reset_timeout`
+    seconds one trial call is let through (half-open); its outcome closes or
+    reopens the circuit. A successful health probe closes it directly.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30, on_change=None):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.on_change = on_change
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == "closed":
+                return
+            wait = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == "open" and wait <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                changed = True
+            else:
+                changed = False
+        if changed:
+            self.notify("half_open")
+            return
+        raise CircuitOpenError(f"Server unavailable; not retrying for {max(wait, 0):.0f}s (circuit open)")
+
+    def record_success(self):
+        with self.lock:
+            changed = self.state != "closed"
+            self.state = "closed"
+            self.failures = 0
+            self.trial_running = False
+        if changed:
+            self.notify("closed")
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            opening = self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold)
+            if opening:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+        if opening:
+            self.notify("open")
+
+    def release(self):
+        """Give up a half-open trial without an outcome, e.g. because it was cancelled."""
+        with self.lock:
+            self.trial_running = False
+
+    def notify(self, state):
+        if self.on_change:
+            self.on_change(state)
+
+
+class Resilience:
+    """Retry policy for transport calls: jittered exponential backoff, a retry budget and a breaker.
+
+    on_event(state, detail) is called from worker threads with "retrying"
+    (detail: "attempt/attempts") and with the breaker's "open", "half_open"
+    and "closed" transitions (detail: None).
+    """
+
+    def __init__(
+        self,
+        attempts=3,
+        base_delay=0.5,
+        max_delay=8,
+        budget=None,
+        breaker_threshold=5,
+        breaker_reset=30,
+        on_event=None,
+    ):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+        self.on_event = on_event
+        self.breaker = CircuitBreaker(
+            breaker_threshold, breaker_reset, on_change=lambda state: self.notify(state, None)
+        )
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        env = os.environ
+        if "LLM_RETRIES" in env:
+            kwargs["attempts"] = int(env["LLM_RETRIES"]) + 1
+        if "LLM_RETRY_BASE_DELAY" in env:
+            kwargs["base_delay"] = float(env["LLM_RETRY_BASE_DELAY"])
+        if "LLM_RETRY_MAX_DELAY" in env:
+            kwargs["max_delay"] = float(env["LLM_RETRY_MAX_DELAY"])
+        if "LLM_RETRY_BUDGET" in env:
+            kwargs["budget"] = RetryBudget(ratio=float(env["LLM_RETRY_BUDGET"]))
+        if "LLM_BREAKER_THRESHOLD" in env:
+            kwargs["breaker_threshold"] = int(env["LLM_BREAKER_THRESHOLD"])
+        if "LLM_BREAKER_RESET" in env:
+            kwargs["breaker_reset"] = float(env["LLM_BREAKER_RESET"])
+        return cls(**kwargs)
+
+    def notify(self, state, detail):
+        if self.on_event:
+            self.on_event(state, detail)
+
+    def delay(self, attempt):
+        # "Full jitter": spreading retries over the whole window keeps clients from retrying in step.
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn, idempotent, retryable=None, cancelled=None):
+        """Run fn(), retrying failures that is_retryable() (and `retryable`, if given) allow.
+
+        `cancelled` is polled so a cancelled request stops retrying.
+        """
+        self.budget.deposit()
+        attempt = 0
+        error = None
+        while True:
+            if error is not None and cancelled is not None and cancelled():
+                raise error
+            self.breaker.allow()
+            try:
+                result = fn()
+            except requests.exceptions.RequestException as e:
+                if cancelled is not None and cancelled():
+                    self.breaker.release()
+                    raise
+                # Any answer at all, even a 4xx, shows the server is up.
+                if is_outage(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                attempt += 1
+                if (
+                    attempt >= self.attempts
+                    or not is_retryable(e, idempotent)
+                    or (retryable is not None and not retryable(e))
+                    or self.breaker.state == "open"
+                    or not self.budget.withdraw()
+                ):
+                    raise
+                self.notify("retrying", f"{attempt + 1}/{self.attempts}")
+                time.sleep(max(self.delay(attempt), retry_after(e) or 0))
+                error = e
+                continue
+            except Exception:
+                # A garbled answer or a bug; it must still end a half-open trial.
+                if cancelled is not None and cancelled():
+                    self.breaker.release()
+                else:
+                    self.breaker.record_failure()
+                raise
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return result
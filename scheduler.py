@@ -0,0 +1,102 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 8
+DEFAULT_PER_SERVER = 3
+
+
+class RequestHandle:
+    """A submitted request that can be cancelled before it starts or while it runs."""
+
+    def __init__(self, server):
+        self.server = server
+        self.cancelled = threading.Event()
+        self.future = None
+        self.response = None
+
+    def attach(self, response):
+        """Remember what cancel() should close: the caller's FlightTicket (see transport.py).
+
+        Closing a ticket only detaches this caller from its shared request;
+        the HTTP request is aborted when it was the last one waiting.
+        Anything else with a close() works as well.
+        """
+        self.response = response
+        if self.cancelled.is_set():
+            response.close()
+
+    def cancel(self):
+        self.cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+        response = self.response
+        if response is not None:
+            response.close()
+
+    def is_cancelled(self):
+        return self.cancelled.is_set()
+
+
+class RequestScheduler:
+    """Bounded worker pool for /ask calls with a concurrency cap per server."""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, per_server=DEFAULT_PER_SERVER):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ask")
+        self.per_server = per_server
+        self.limits = {}
+        self.active = set()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ
+        return cls(
+            max_workers=int(env.get("LLM_WORKERS", DEFAULT_WORKERS)),
+            per_server=int(env.get("LLM_MAX_CONCURRENT", DEFAULT_PER_SERVER)),
+        )
+
+    def limit(self, server, endpoints=1):
+        with self.lock:
+            if server not in self.limits:
+                self.limits[server] = threading.BoundedSemaphore(self.per_server * endpoints)
+            return self.limits[server]
+
+    def submit(self, server, fn, *args, endpoints=1):
+        """Run fn(handle, *args) on the pool once `server` has a free slot.
+
+        `server` may stand for several `endpoints` sharing the load; each of
+        them counts towards the cap, so the deployment gets per_server apiece.
+        """
+        handle = RequestHandle(server)
+        limit = self.limit(server, endpoints)
+
+        def run():
+            with limit:
+                if handle.is_cancelled():
+                    return None
+                return fn(handle, *args)
+
+        with self.lock:
+            self.active.add(handle)
+        handle.future = self.executor.submit(run)
+        handle.future.add_done_callback(lambda _: self.finished(handle))
+        return handle
+
+    def finished(self, handle):
+        with self.lock:
+            self.active.discard(handle)
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.active)
+
+    def cancel_all(self):
+        with self.lock:
+            handles = list(self.active)
+        for handle in handles:
+            handle.cancel()
+
+    def shutdown(self):
+        self.cancel_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,140 @@
+from datetime import datetime
+
+import customtkinter as ctk
+
+PAGE_SIZE = 10
+
+
+class HistorySidebar:
+    """Past-question buttons in the sidebar, updated in place instead of rebuilt.
+
+    A new answer prepends one button and recycles the oldest; "Load older"
+    appends the next page; search results rebind the existing buttons. Labels
+    are formatted once, when an entry is bound.
+    """
+
+    def __init__(self, frame, colors, on_select, load_page, page_size=PAGE_SIZE):
+        self.frame = frame
+        self.colors = colors
+        self.on_select = on_select
+        self.load_page = load_page
+        self.page_size = page_size
+
+        self.buttons = []
+        self.entries = []
+        self.spare = []
+        self.capacity = page_size
+        self.searching = False
+
+        self.more_button = ctk.CTkButton(
+            frame,
+            text="Load older",
+            font=("Roboto", 12),
+            fg_color="transparent",
+            text_color=colors["accent"],
+            hover_color=colors["bg_dark"],
+            corner_radius=5,
+            height=30,
+            command=self.load_more
+        )
+
+    def label(self, entry):
+        timestamp = datetime.fromisoformat(entry["timestamp"])
+        question = entry["question"]
+        if len(question) > 30:
+            question = question[:27] + "..."
+        return f"{timestamp.strftime('%H:%M:%S')} - {question}"
+
+    def make_button(self):
+        return ctk.CTkButton(
+            self.frame,
+            text="",
+            font=("Roboto", 12),
+            anchor="w",
+            fg_color="transparent",
+            text_color=self.colors["text_muted"],
+            hover_color=self.colors["bg_dark"],
+            corner_radius=5,
+            height=30
+        )
+
+    def bind_button(self, button, entry):
+        button.configure(
+            text=self.label(entry),
+            command=lambda q=entry["question"], r=entry["response"]: self.on_select(q, r)
+        )
+
+    def pack_button(self, button, before=None):
+        if before is None and self.more_button.winfo_manager():
+            before = self.more_button
+        if before is None:
+            button.pack(fill="x", pady=(0, 5))
+        else:
+            button.pack(fill="x", pady=(0, 5), before=before)
+
+    def take_button(self):
+        return self.spare.pop() if self.spare else self.make_button()
+
+    def show(self, entries):
+        """Bind `entries` (newest first) to the buttons, reusing what already exists."""
+        entries = list(entries)
+        for i, entry in enumerate(entries):
+            if i < len(self.buttons):
+                self.bind_button(self.buttons[i], entry)
+            else:
+                button = self.take_button()
+                self.bind_button(button, entry)
+                self.pack_button(button)
+                self.buttons.append(button)
+        for button in self.buttons[len(entries):]:
+            button.pack_forget()
+            self.spare.append(button)
+        del self.buttons[len(entries):]
+        self.entries = entries
+
+    def show_recent(self, entries):
+        self.searching = False
+        self.capacity = self.page_size
+        self.show(entries)
+        if len(self.entries) >= self.page_size:
+            self.more_button.pack(fill="x", pady=(0, 5))
+        else:
+            self.more_button.pack_forget()
+
+    def show_results(self, entries):
+        self.searching = True
+        self.more_button.pack_forget()
+        self.show(entries)
+
+    def prepend(self, entry):
+        # Search results stay put; the entry shows up when the search is cleared.
+        if self.searching:
+            return
+        if len(self.buttons) >= self.capacity:
+            button = self.buttons.pop()
+            self.entries.pop()
+            self.more_button.pack(fill="x", pady=(0, 5))
+        else:
+            button = self.take_button()
+        self.bind_button(button, entry)
+        self.pack_button(button, before=self.buttons[0] if self.buttons else None)
+        self.buttons.insert(0, button)
+        self.entries.insert(0, entry)
+
+    def load_more(self):
+        self.more_button.configure(state="disabled")
+        self.load_page(len(self.entries), self.page_size, self.append_page)
+
+    def append_page(self, entries):
+        self.more_button.configure(state="normal")
+        if self.searching:
+            return
+        for entry in entries:
+            button = self.take_button()
+            self.bind_button(button, entry)
+            self.pack_button(button)
+            self.buttons.append(button)
+            self.entries.append(entry)
+        self.capacity = max(len(self.buttons), self.page_size)
+        if len(entries) < self.page_size:
+            self.more_button.pack_forget()
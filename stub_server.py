@@ -0,0 +1,248 @@
+import argparse
+import gzip
+import json
+import random
+import re
+import socket
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = (
+    "## Stub answer\n"
+    "You asked: **{question}**\n\n"
+    "- This reply comes from `stub_server.py`, not a model.\n"
+    "- See the [README](https://github.com/iamvigneshwars/llm-client) for configuration.\n"
+)
+GZIP_OVER = 1024
+FILLER = "The quick brown fox jumps over the lazy dog while the *server* streams `tokens`. "
+
+
+def make_answer(question, extra_tokens=0):
+    answer = ANSWER.format(question=question.strip() or "(nothing)")
+    if extra_tokens:
+        words = FILLER.split(" ")
+        answer += "\n" + " ".join(words[i % len(words)] for i in range(extra_tokens)) + "\n"
+    return answer
+
+
+def tokenize(text):
+    """Split text into word-sized pieces that join back to the original."""
+    return re.findall(r"\s*\S+|\s+", text)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Speaks both the Diamond /ask protocol and OpenAI /v1/chat/completions.
+
+    The server's settings add latency before the first byte, pace tokens,
+    answer a fraction of requests with 503 and cut a fraction of streams off
+    halfway, so clients can be tried against a slow or flaky server.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "StubLLM/1.0"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json({"status": "ok"})
+        elif self.path == "/v1/models":
+            self.send_json({"object": "list", "data": [{"id": self.server.model, "object": "model"}]})
+        else:
+            self.send_json({"error": f"No route for {self.path}"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            data = self.rfile.read(length)
+            if self.headers.get("Content-Encoding") == "gzip":
+                data = gzip.decompress(data)
+            body = json.loads(data or b"{}")
+        except (ValueError, OSError):
+            self.send_json({"error": "Request body is not JSON"}, status=400)
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if random.random() < self.server.failure_rate:
+            self.send_json({"error": "Injected failure"}, status=503)
+            return
+        if self.server.no_stream:
+            body["stream"] = False
+        if self.path == "/ask":
+            self.ask(body)
+        elif self.path == "/v1/chat/completions":
+            self.chat_completions(body)
+        else:
+            self.send_json({"error": f"No route for {self.path}"}, status=404)
+
+    def ask(self, body):
+        question = body.get("question", "")
+        tokens = tokenize(make_answer(question, self.server.extra_tokens))
+        metadata = {"source": "stub", "tokens": len(tokens)}
+        if not body.get("stream"):
+            self.pause(len(tokens))
+            self.send_json({"answer": "".join(tokens), "metadata": metadata})
+            return
+        self.start_stream("application/x-ndjson")
+        for token in self.stream_tokens(tokens):
+            self.send_chunk(json.dumps({"token": token}) + "\n")
+        if self.dropped:
+            return
+        self.send_chunk(json.dumps({"done": True, "metadata": metadata}) + "\n")
+        self.end_stream()
+
+    def chat_completions(self, body):
+        messages = body.get("messages") or []
+        question = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        tokens = tokenize(make_answer(question, self.server.extra_tokens))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", self.server.model)
+        usage = {"prompt_tokens": len(tokenize(question)), "completion_tokens": len(tokens)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if not body.get("stream"):
+            self.pause(len(tokens))
+            self.send_json({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+            return
+
+        def chunk(delta, finish_reason=None, **extra):
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            return f"data: {json.dumps(event)}\n\n"
+
+        self.start_stream("text/event-stream")
+        self.send_chunk(chunk({"role": "assistant"}))
+        for token in self.stream_tokens(tokens):
+            self.send_chunk(chunk({"content": token}))
+        if self.dropped:
+            return
+        self.send_chunk(chunk({}, "stop", usage=usage))
+        self.send_chunk("data: [DONE]\n\n")
+        self.end_stream()
+
+    def stream_tokens(self, tokens):
+        """Yield tokens at the configured pace; a dropped stream ends with the socket closed."""
+        drop_at = len(tokens) // 2 if random.random() < self.server.drop_rate else None
+        self.dropped = False
+        for i, token in enumerate(tokens):
+            if i == drop_at:
+                self.dropped = True
+                self.close_connection = True
+                self.connection.shutdown(socket.SHUT_RDWR)
+                return
+            self.pause(1)
+            yield token
+
+    def pause(self, tokens):
+        if self.server.token_delay:
+            time.sleep(self.server.token_delay * tokens)
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if len(body) > GZIP_OVER and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_stream(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def send_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        token_delay=0.02,
+        model="stub",
+        quiet=False,
+        latency=0.0,
+        failure_rate=0.0,
+        drop_rate=0.0,
+        extra_tokens=0,
+        no_stream=False,
+    ):
+        super().__init__(address, StubHandler)
+        self.token_delay = token_delay
+        self.model = model
+        self.quiet = quiet
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self.extra_tokens = extra_tokens
+        self.no_stream = no_stream
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the LLM server, for trying the clients offline.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed tokens")
+    parser.add_argument("--model", default="stub", help="model name reported by /v1/models")
+    parser.add_argument("--quiet", action="store_true", help="do not log requests")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before answering a question")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of questions answered with 503")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of streams cut off halfway")
+    parser.add_argument("--extra-tokens", type=int, default=0, help="filler tokens added to every answer")
+    parser.add_argument("--no-stream", action="store_true", help="always answer with plain JSON")
+    args = parser.parse_args(argv)
+
+    server = StubServer(
+        (args.host, args.port),
+        token_delay=args.token_delay,
+        model=args.model,
+        quiet=args.quiet,
+        latency=args.latency,
+        failure_rate=args.failure_rate,
+        drop_rate=args.drop_rate,
+        extra_tokens=args.extra_tokens,
+        no_stream=args.no_stream,
+    )
+    print(f"Stub LLM server on http://{args.host}:{args.port} (/ask and /v1/chat/completions)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
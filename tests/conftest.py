@@ -0,0 +1,27 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import StubServer  # noqa: E402
+
+
+@pytest.fixture
+def stub():
+    """Start a quiet in-process stub server; call it with StubServer settings, get its URL."""
+    servers = []
+
+    def start(**settings):
+        settings.setdefault("token_delay", 0)
+        server = StubServer(("127.0.0.1", 0), quiet=True, **settings)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,54 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_interrupt_keeps_answers_and_does_not_wait_for_the_server(stub, tmp_path):
+    url = stub(latency=30)
+    questions = tmp_path / "questions.jsonl"
+    questions.write_text("".join(json.dumps({"id": str(i), "question": "q"}) + "\n" for i in range(4)))
+    output = tmp_path / "answers.jsonl"
+    output.write_text(json.dumps({"id": "earlier", "answer": "kept"}) + "\n")
+
+    process = subprocess.Popen(
+        [sys.executable, "batch.py", str(questions), str(output), "--base-url", url, "-j", "2"],
+        cwd=ROOT,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        time.sleep(1)
+        start = time.monotonic()
+        process.send_signal(signal.SIGINT)
+        _, stderr = process.communicate(timeout=10)
+    finally:
+        process.kill()
+
+    assert time.monotonic() - start < 5
+    assert process.returncode == 130
+    assert "Interrupted" in stderr
+    assert json.loads(output.read_text().splitlines()[0])["answer"] == "kept"
+
+
+def test_base_url_flag_keeps_the_environment_settings(stub, tmp_path):
+    questions = tmp_path / "questions.jsonl"
+    questions.write_text(json.dumps({"id": "1", "question": "q"}) + "\n")
+    capture = tmp_path / "capture.jsonl"
+    env = dict(os.environ, LLM_CAPTURE_FILE=str(capture), LLM_SERVER_URL="http://127.0.0.1:1")
+
+    subprocess.run(
+        [sys.executable, "batch.py", str(questions), str(tmp_path / "answers.jsonl"), "--base-url", stub()],
+        cwd=ROOT,
+        env=env,
+        check=True,
+        capture_output=True,
+        timeout=30,
+    )
+    [record] = [json.loads(line) for line in capture.read_text().splitlines()]
+    assert record["question"] == "q"
+    assert record["error"] is None
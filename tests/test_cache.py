@@ -0,0 +1,57 @@
+import sqlite3
+import threading
+
+from cache import ResponseCache
+
+
+def used_times(path):
+    with sqlite3.connect(path) as conn:
+        return dict(conn.execute("SELECT key, used FROM cache"))
+
+
+def test_normalized_re_ask_hits(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    cache.put("s", "What is Diamond?", {"answer": "A synchrotron."})
+    assert cache.get("s", "  what is diamond ") == {"answer": "A synchrotron."}
+    assert cache.get("other", "What is Diamond?") is None
+    cache.close()
+
+
+def test_hits_do_not_write_until_the_next_put_or_close(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(path, memory_entries=0)
+    cache.put("s", "q", {"answer": "a"})
+    before = used_times(path)
+
+    assert cache.get("s", "q") == {"answer": "a"}
+    assert not cache.conn.in_transaction
+    assert used_times(path) == before
+
+    cache.close()
+    [(key, used)] = used_times(path).items()
+    assert used > before[key]
+
+
+def test_eviction_keeps_recently_read_entries(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"), memory_entries=0, disk_bytes=350)
+    cache.put("s", "old", {"answer": "x" * 80})
+    cache.put("s", "new", {"answer": "x" * 80})
+    cache.get("s", "old")
+    cache.put("s", "third", {"answer": "x" * 80})
+    cache.put("s", "fourth", {"answer": "x" * 80})
+    assert cache.get("s", "old") is not None
+    assert cache.get("s", "new") is None
+    cache.close()
+
+
+def test_lookups_do_not_wait_for_a_write_in_progress(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"), memory_entries=0)
+    cache.put("s", "q", {"answer": "a"})
+    results = []
+    with cache.db_lock:
+        # As if a worker were in the middle of put()'s commit.
+        lookup = threading.Thread(target=lambda: results.append(cache.get("s", "q")))
+        lookup.start()
+        lookup.join(timeout=2)
+        assert results == [{"answer": "a"}]
+    cache.close()
@@ -0,0 +1,58 @@
+import uiprofiler
+from dispatcher import Dispatcher
+
+
+class FakeWidget:
+    """Just enough of a Tk widget for the dispatcher; tests call pump() themselves."""
+
+    def __init__(self):
+        self.errors = []
+
+    def after(self, ms, func):
+        return "job"
+
+    def after_cancel(self, job):
+        pass
+
+    def report_callback_exception(self, *exc_info):
+        self.errors.append(exc_info[1])
+
+
+def test_keyed_updates_coalesce_and_keep_order():
+    dispatcher = Dispatcher(FakeWidget())
+    calls = []
+    dispatcher.post(calls.append, "status 1", key="status")
+    dispatcher.post(calls.append, "chunk")
+    dispatcher.post(calls.append, "status 2", key="status")
+    dispatcher.pump()
+    assert calls == ["chunk", "status 2"]
+
+
+def test_a_failing_update_does_not_stop_the_rest():
+    widget = FakeWidget()
+    dispatcher = Dispatcher(widget)
+    calls = []
+    dispatcher.post(lambda: 1 / 0)
+    dispatcher.post(calls.append, "after")
+    dispatcher.pump()
+    assert calls == ["after"]
+    assert isinstance(widget.errors[0], ZeroDivisionError)
+
+
+def test_profiler_times_each_update_under_its_own_name():
+    widget = FakeWidget()
+    dispatcher = Dispatcher(widget)
+    profiler = uiprofiler.UIProfiler(widget)
+
+    def show_status():
+        pass
+
+    uiprofiler.active = profiler
+    try:
+        dispatcher.post(show_status)
+        dispatcher.post(show_status)
+        dispatcher.pump()
+    finally:
+        uiprofiler.active = None
+    name = show_status.__qualname__
+    assert profiler.handlers[name]["calls"] == 2
@@ -0,0 +1,34 @@
+from endpoints import EndpointPool
+
+
+def test_prefers_the_endpoint_with_less_outstanding_work():
+    pool = EndpointPool(["http://a", "http://b"])
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+    pool.release(first)
+    assert pool.acquire() is first
+
+
+def test_prefers_the_faster_endpoint():
+    pool = EndpointPool(["http://a", "http://b"])
+    slow, fast = pool.endpoints
+    pool.record_success(slow, 2.0)
+    pool.record_success(fast, 0.1)
+    assert pool.acquire() is fast
+
+
+def test_failing_endpoint_is_benched_until_it_recovers():
+    pool = EndpointPool(["http://a", "http://b"])
+    down, up = pool.endpoints
+    pool.record_failure(down)
+    assert pool.up_count() == 1
+    assert pool.acquire() is up
+    assert pool.acquire(exclude=[up]) is down
+    pool.record_success(down)
+    assert pool.up_count() == 2
+
+
+def test_none_when_every_endpoint_is_excluded():
+    pool = EndpointPool(["http://a"])
+    assert pool.acquire(exclude=pool.endpoints) is None
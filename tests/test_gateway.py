@@ -0,0 +1,91 @@
+import gzip
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from gateway import Gateway
+from transport import Transport
+
+
+@pytest.fixture
+def gateway(stub):
+    servers = []
+
+    def start(**settings):
+        transport = Transport(stub(latency=settings.pop("latency", 0)))
+        server = Gateway(("127.0.0.1", 0), transport, quiet=True, **settings)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+        server.transport.close()
+
+
+def ask(url, client_id):
+    return requests.post(f"{url}/ask", json={"question": "hi"}, headers={"X-Client-Id": client_id}, timeout=10)
+
+
+def test_client_id_header_cannot_dodge_the_rate_limit(gateway):
+    _, url = gateway(rate=0.1, burst=1)
+    assert ask(url, "a").status_code == 200
+    assert ask(url, "b").status_code == 429
+
+
+def test_trusted_proxy_can_name_its_clients(gateway):
+    _, url = gateway(rate=0.1, burst=1, trusted_proxies=["127.0.0.1"])
+    assert ask(url, "a").status_code == 200
+    assert ask(url, "b").status_code == 200
+    assert ask(url, "a").status_code == 429
+
+
+def test_idle_buckets_are_forgotten(gateway):
+    server, _ = gateway(rate=100, burst=1)
+    for client in range(50):
+        server.admit(f"client-{client}")
+    time.sleep(0.05)
+    server.admit("last")
+    assert list(server.buckets) == ["last"]
+
+
+def test_questions_wait_in_client_queues_while_upstream_is_full(gateway):
+    server, url = gateway(rate=0, max_inflight=2, latency=0.5)
+    results = []
+    threads = [
+        threading.Thread(target=lambda q=q: results.append(requests.post(f"{url}/ask", json={"question": q})))
+        for q in "abcdef"
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.3)
+    assert server.batcher.stats()["waiting"] == 4
+    for thread in threads:
+        thread.join()
+    assert [r.status_code for r in results] == [200] * 6
+
+
+def test_accepts_gzipped_questions(gateway):
+    _, url = gateway(rate=0)
+    body = gzip.compress(json.dumps({"question": "hi"}).encode("utf-8"))
+    response = requests.post(
+        f"{url}/ask", data=body, headers={"Content-Type": "application/json", "Content-Encoding": "gzip"}, timeout=10
+    )
+    assert response.status_code == 200
+    assert response.json()["answer"]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [[1], "x", 3, {}, {"question": ""}, {"question": 5}, {"question": ["q"]}, {"question": "q", "history": "x"}],
+)
+def test_malformed_questions_get_400(gateway, body):
+    _, url = gateway(rate=0)
+    response = requests.post(f"{url}/ask", json=body, timeout=10)
+    assert response.status_code == 400
+    assert "error" in response.json()
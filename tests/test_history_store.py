@@ -0,0 +1,70 @@
+import sqlite3
+import threading
+
+import pytest
+
+from history_store import JsonlHistoryStore, SqliteHistoryStore
+
+
+def entry(question):
+    return {"timestamp": "2024-01-01T00:00:00", "question": question, "response": f"about {question}"}
+
+
+def flush_within(store, seconds=5):
+    flusher = threading.Thread(target=store.flush, daemon=True)
+    flusher.start()
+    flusher.join(seconds)
+    return not flusher.is_alive()
+
+
+@pytest.fixture(params=["jsonl", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "jsonl":
+        store = JsonlHistoryStore(str(tmp_path / "history.jsonl"), legacy_path=None, fsync_interval=0.05)
+    else:
+        store = SqliteHistoryStore(str(tmp_path / "history.db"), import_path=None, commit_interval=0.05)
+    yield store
+    store.close()
+
+
+def test_appended_entries_can_be_read_back_and_searched(store):
+    for question in ("beamline status", "detector gain", "beamline energy"):
+        store.append(entry(question))
+    store.flush()
+    assert [e["question"] for e in store.tail(2)] == ["detector gain", "beamline energy"]
+    assert [e["question"] for e in store.search("beamline")] == ["beamline energy", "beamline status"]
+
+
+def test_jsonl_writer_survives_a_failed_write(tmp_path, capsys):
+    path = tmp_path / "history.jsonl"
+    store = JsonlHistoryStore(str(path), legacy_path=None)
+    # The log cannot be opened while a directory stands in its place.
+    path.mkdir()
+    store.append(entry("lost"))
+    assert flush_within(store)
+    assert "Could not write history" in capsys.readouterr().err
+
+    path.rmdir()
+    store.append(entry("kept"))
+    store.close()
+    assert [e["question"] for e in store.iter_entries()] == ["kept"]
+
+
+def test_sqlite_writer_survives_a_failed_batch(tmp_path, monkeypatch, capsys):
+    store = SqliteHistoryStore(str(tmp_path / "history.db"), import_path=None, commit_interval=0.05)
+    insert = store.insert
+    failures = [sqlite3.OperationalError("database is locked")]
+
+    def flaky_insert(conn, entries):
+        if failures:
+            raise failures.pop()
+        insert(conn, entries)
+
+    monkeypatch.setattr(store, "insert", flaky_insert)
+    store.append(entry("lost"))
+    assert flush_within(store)
+    assert "database is locked" in capsys.readouterr().err
+
+    store.append(entry("kept"))
+    store.close()
+    assert [e["question"] for e in store.iter_entries()] == ["kept"]
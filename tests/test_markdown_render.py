@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from markdown_render import MarkdownStream, plain_text, render_inline, render_markdown
+
+
+def test_headers():
+    assert render_markdown("# Title\n### Small") == [("Title", ("h1",)), ("\n", ()), ("Small", ("h3",))]
+    assert render_markdown("###### Deep") == [("Deep", ("h3",))]
+
+
+def test_bold_and_italic_nest():
+    assert render_inline("a **b *c* d** e") == [
+        ("a ", ()),
+        ("b ", ("bold",)),
+        ("c", ("bold", "italic")),
+        (" d", ("bold",)),
+        (" e", ()),
+    ]
+
+
+def test_unmatched_markers_stay_literal():
+    assert render_inline("2 * 3 ** 4 `x") == [("2 * 3 ** 4 `x", ())]
+    assert render_inline("snake_case_name") == [("snake_case_name", ())]
+
+
+def test_inline_code_is_not_formatted_inside():
+    assert render_inline("run `a **b**` now") == [("run ", ()), ("a **b**", ("code",)), (" now", ())]
+
+
+def test_links():
+    assert render_inline("see [the docs](https://example.org/a_(b)) here") == [
+        ("see ", ()),
+        ("the docs", ("link", "href:https://example.org/a_(b)")),
+        (" here", ()),
+    ]
+    assert render_inline("[no target] (x)") == [("[no target] (x)", ())]
+
+
+def test_fenced_code_block_is_taken_verbatim():
+    segments = render_markdown("before\n```python\n# not a header\n**x**\n```\nafter")
+    assert segments == [
+        ("before", ()),
+        ("\n", ()),
+        ("# not a header", ("code_block",)),
+        ("\n", ("code_block",)),
+        ("**x**", ("code_block",)),
+        ("\n", ("code_block",)),
+        ("after", ()),
+    ]
+
+
+def test_lists_quotes_and_rules():
+    assert render_markdown("- item\n> said\n---") == [
+        ("• ", ("list",)),
+        ("item", ("list",)),
+        ("\n", ()),
+        ("said", ("quote",)),
+        ("\n", ()),
+        ("─" * 24, ("rule",)),
+    ]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_streamed_chunks_render_like_the_whole_text(size):
+    text = "# Plan\nUse **bold** and `code`.\n``" + "`sh\nls -l # list\n```\n[link](http://x)\n"
+    stream = MarkdownStream()
+    segments = []
+    for i in range(0, len(text), size):
+        segments += stream.feed(text[i:i + size])
+    segments += stream.close()
+    assert segments == render_markdown(text)
+
+
+def test_fence_split_across_chunks():
+    stream = MarkdownStream()
+    assert stream.feed("``") == []
+    assert stream.pending == "``"
+    assert stream.feed("`\n# inside") == []
+    assert stream.in_code
+    assert stream.feed("\n``") == [("# inside", ("code_block",)), ("\n", ("code_block",))]
+    assert stream.feed("`\nout\n") == [("out", ()), ("\n", ())]
+    assert not stream.in_code
+
+
+def test_unclosed_links_render_in_linear_time():
+    line = "[x](" * 20000 + "**" * 20000
+    start = time.perf_counter()
+    assert plain_text(render_inline(line)) == line
+    assert time.perf_counter() - start < 2
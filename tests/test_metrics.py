@@ -0,0 +1,29 @@
+import threading
+
+from metrics import Metrics, new_sample
+
+
+def finish_many(metrics, count):
+    for _ in range(count):
+        metrics.finish(new_sample("ask"))
+
+
+def test_concurrent_prometheus_exports_do_not_collide(tmp_path):
+    path = tmp_path / "client.prom"
+    metrics = Metrics(path=str(path), export_interval=0)
+    threads = [threading.Thread(target=finish_many, args=(metrics, 50)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics.close()
+
+    assert 'llm_client_requests_total{kind="ask"} 400' in path.read_text()
+    assert [p.name for p in tmp_path.iterdir()] == ["client.prom"]
+
+
+def test_export_errors_do_not_fail_the_request(tmp_path, capsys):
+    metrics = Metrics(path=str(tmp_path / "missing" / "client.prom"), export_interval=0)
+    metrics.finish(new_sample("ask"))
+    assert metrics.counts("ask")["requests"] == 1
+    assert "Could not write metrics" in capsys.readouterr().err
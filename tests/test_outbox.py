@@ -0,0 +1,27 @@
+from outbox import Outbox
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "outbox.jsonl")
+    outbox = Outbox(path)
+    first = outbox.add("one")
+    outbox.add("two", [{"role": "user", "content": "hi"}])
+    outbox.remove(first["id"])
+
+    reopened = Outbox(path)
+    assert [entry["question"] for entry in reopened.queued()] == ["two"]
+    assert reopened.queued()[0]["history"] == [{"role": "user", "content": "hi"}]
+
+
+def test_claim_hands_out_entries_in_order_up_to_the_concurrency(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.jsonl"), concurrency=2)
+    ids = [outbox.add(question)["id"] for question in ("a", "b", "c")]
+    assert outbox.claim()["id"] == ids[0]
+    assert outbox.claim()["id"] == ids[1]
+    assert outbox.claim() is None
+
+    outbox.release(ids[0])
+    assert outbox.claim()["id"] == ids[0]
+    outbox.remove(ids[1])
+    assert outbox.claim()["id"] == ids[2]
+    assert len(outbox) == 2
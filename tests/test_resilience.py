@@ -0,0 +1,95 @@
+import pytest
+import requests
+
+from resilience import CircuitOpenError, Resilience, RetryBudget
+
+
+def refused():
+    raise requests.exceptions.ConnectTimeout("connect timed out")
+
+
+def read_timeout():
+    raise requests.exceptions.ReadTimeout("read timed out")
+
+
+def counting(fn, calls):
+    def call():
+        calls.append(1)
+        return fn()
+
+    return call
+
+
+def test_retries_failures_before_the_server_was_reached():
+    calls = []
+    resilience = Resilience(attempts=3, base_delay=0)
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        resilience.call(counting(refused, calls), idempotent=False)
+    assert len(calls) == 3
+
+
+def test_does_not_repeat_a_request_the_server_may_have_started():
+    calls = []
+    resilience = Resilience(attempts=3, base_delay=0)
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        resilience.call(counting(read_timeout, calls), idempotent=False)
+    assert len(calls) == 1
+
+
+def test_stops_retrying_once_cancelled():
+    calls = []
+    resilience = Resilience(attempts=5, base_delay=0)
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        resilience.call(counting(refused, calls), idempotent=True, cancelled=lambda: len(calls) >= 2)
+    assert len(calls) == 2
+
+
+def test_retries_are_limited_by_the_budget():
+    calls = []
+    resilience = Resilience(attempts=5, base_delay=0, budget=RetryBudget(ratio=0, max_tokens=1))
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        resilience.call(counting(refused, calls), idempotent=True)
+    assert len(calls) == 2
+
+
+def test_breaker_opens_and_fails_fast():
+    resilience = Resilience(attempts=1, breaker_threshold=2, breaker_reset=60)
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.ConnectTimeout):
+            resilience.call(refused, idempotent=True)
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        resilience.call(counting(lambda: "ok", calls), idempotent=True)
+    assert not calls
+
+
+def test_half_open_trial_closes_the_breaker():
+    resilience = Resilience(attempts=1, breaker_threshold=1, breaker_reset=0)
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        resilience.call(refused, idempotent=True)
+    assert resilience.breaker.state == "open"
+    assert resilience.call(lambda: "ok", idempotent=True) == "ok"
+    assert resilience.breaker.state == "closed"
+
+
+def test_cancelled_half_open_trial_lets_the_next_one_through():
+    resilience = Resilience(attempts=1, breaker_threshold=1, breaker_reset=0)
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        resilience.call(refused, idempotent=True)
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        resilience.call(read_timeout, idempotent=True, cancelled=lambda: True)
+    assert resilience.call(lambda: "ok", idempotent=True) == "ok"
+
+
+def test_unexpected_error_in_half_open_trial_frees_the_trial():
+    resilience = Resilience(attempts=1, breaker_threshold=1, breaker_reset=0)
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        resilience.call(refused, idempotent=True)
+
+    def garbled():
+        raise ValueError("Invalid JSON response")
+
+    with pytest.raises(ValueError):
+        resilience.call(garbled, idempotent=True)
+    assert not resilience.breaker.trial_running
+    assert resilience.call(lambda: "ok", idempotent=True) == "ok"
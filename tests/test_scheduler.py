@@ -0,0 +1,46 @@
+import threading
+import time
+
+from scheduler import RequestScheduler
+
+
+def peak_concurrency(scheduler, count, **kwargs):
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def work(handle):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    handles = [scheduler.submit("http://a,http://b", work, **kwargs) for _ in range(count)]
+    for handle in handles:
+        handle.future.result()
+    return running[1]
+
+
+def test_cap_applies_per_server():
+    scheduler = RequestScheduler(max_workers=8, per_server=2)
+    assert peak_concurrency(scheduler, 8) == 2
+    scheduler.shutdown()
+
+
+def test_cap_scales_with_the_endpoints_behind_a_server():
+    scheduler = RequestScheduler(max_workers=8, per_server=2)
+    assert peak_concurrency(scheduler, 8, endpoints=2) == 4
+    scheduler.shutdown()
+
+
+def test_cancelled_request_does_not_run():
+    scheduler = RequestScheduler(max_workers=1, per_server=1)
+    gate = threading.Event()
+    ran = []
+    scheduler.submit("s", lambda handle: gate.wait())
+    handle = scheduler.submit("s", lambda handle: ran.append(1))
+    handle.cancel()
+    gate.set()
+    scheduler.executor.shutdown(wait=True)
+    assert not ran
@@ -0,0 +1,177 @@
+import json
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from resilience import Resilience
+from scheduler import RequestHandle
+from transport import Transport
+
+
+@pytest.fixture
+def transport(stub):
+    transports = []
+
+    def make(**kwargs):
+        url = stub(latency=kwargs.pop("latency", 0))
+        transport = Transport(url, **kwargs)
+        transports.append(transport)
+        return transport
+
+    yield make
+    for transport in transports:
+        transport.close()
+
+
+def test_identical_questions_share_one_request(transport):
+    t = transport(latency=0.3)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(t.ask("same"))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 3
+    assert all(r["answer"] and r == results[0] for r in results)
+    assert t.metrics.counts("ask")["requests"] == 1
+
+
+
+def test_identical_questions_are_each_sent_without_coalescing(transport):
+    t = transport(latency=0.3, coalesce=False)
+    threads = [threading.Thread(target=t.ask, args=("same",)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert t.metrics.counts("ask")["requests"] == 3
+    assert not t.flights
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_question_asked_after_cancel_gets_a_full_answer(transport, stream):
+    t = transport(latency=0.5)
+    on_token = (lambda token: None) if stream else None
+    handle = RequestHandle(t.base_url)
+    cancelled = []
+    thread = threading.Thread(target=lambda: cancelled.append(t.ask("q", on_token=on_token, handle=handle)))
+    thread.start()
+    time.sleep(0.2)
+    handle.cancel()
+    # Asked while the abandoned request is still waiting for its headers.
+    result = t.ask("q", on_token=on_token)
+    thread.join()
+
+    assert cancelled == [{"error": "Request cancelled"}]
+    assert result["answer"]
+    assert "error" not in result
+
+
+def test_abandoned_request_is_not_recorded_as_an_answer(transport):
+    t = transport(latency=0.3)
+    handle = RequestHandle(t.base_url)
+    threading.Timer(0.1, handle.cancel).start()
+    assert t.ask("q", on_token=lambda token: None, handle=handle) == {"error": "Request cancelled"}
+    assert t.metrics.counts("ask")["errors"] == 1
+    assert not t.flights
+
+
+class BrokenBodyHandler(BaseHTTPRequestHandler):
+    """Sends a JSON answer's headers and half its body, then stalls or hangs up."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"answer": "x" * 100, "metadata": None}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body[: len(body) // 2])
+        self.wfile.flush()
+        if self.server.stall:
+            time.sleep(3)
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def broken_body():
+    servers = []
+
+    def start(stall):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), BrokenBodyHandler)
+        server.daemon_threads = True
+        server.stall = stall
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize(
+    "stall, error",
+    [(True, requests.exceptions.ReadTimeout), (False, requests.exceptions.ChunkedEncodingError)],
+)
+def test_broken_json_body_raises_a_request_exception(broken_body, stall, error):
+    transport = Transport(broken_body(stall), read_timeout=0.5, resilience=Resilience(attempts=1))
+    try:
+        with pytest.raises(error):
+            transport.ask("q")
+    finally:
+        transport.close()
+
+
+class ResetHandler(BaseHTTPRequestHandler):
+    """Reads the whole question, then resets the connection without answering."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.asked += 1
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def unused_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_fails_over_from_a_node_that_refuses_connections(stub):
+    refused = f"http://127.0.0.1:{unused_port()}"
+    transport = Transport(f"{refused},{stub()}", resilience=Resilience(attempts=1))
+    try:
+        assert transport.ask("q")["answer"]
+    finally:
+        transport.close()
+
+
+def test_does_not_fail_over_once_the_question_was_sent(stub):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ResetHandler)
+    server.asked = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    transport = Transport(f"http://127.0.0.1:{server.server_port},{stub()}", resilience=Resilience(attempts=1))
+    try:
+        with pytest.raises(requests.exceptions.ConnectionError):
+            transport.ask("q")
+        assert server.asked == 1
+    finally:
+        transport.close()
+        server.shutdown()
+        server.server_close()
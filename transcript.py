@@ -0,0 +1,332 @@
+import bisect
+import math
+import tkinter as tk
+import tkinter.font as tkfont
+
+import customtkinter as ctk
+
+from markdown_render import configure_tags, insert_segments, plain_text
+
+ROW_SPACING = 15
+WRAP_LENGTH = 600
+OVERSCAN = 3
+SCROLL_STEP = 30
+
+# role -> (header text, header color, body color, bubble color), as keys into the colors dict
+ROLE_STYLES = {
+    "user": ("You", "accent", "text_light", "user_message_bg"),
+    "bot": ("Diamond", "accent", "text_light", "bot_message_bg"),
+    "cached": ("Diamond (cached)", "warning", "text_light", "bot_message_bg"),
+    "error": ("Error", "error", "error", "bot_message_bg"),
+}
+
+
+class MessageRow:
+    """A recyclable message bubble drawn as a window item on the transcript canvas.
+
+    The body is a Tk Text widget so rendered markdown keeps its tags; streamed
+    segments are appended in place rather than re-inserting the whole message.
+    """
+
+    def __init__(self, transcript):
+        self.transcript = transcript
+        self.frame = ctk.CTkFrame(transcript.canvas, corner_radius=10)
+        self.header = ctk.CTkLabel(self.frame, text="", font=("Roboto", 12, "bold"))
+        self.header.grid(row=0, column=0, sticky="w", padx=15, pady=(10, 0))
+        self.body = tk.Text(
+            self.frame,
+            font=transcript.body_font,
+            wrap="word",
+            width=transcript.max_chars,
+            height=1,
+            relief="flat",
+            borderwidth=0,
+            highlightthickness=0,
+            padx=0,
+            pady=0,
+            cursor="arrow",
+            state="disabled"
+        )
+        configure_tags(self.body, transcript.colors)
+        self.body.grid(row=1, column=0, sticky="w", padx=15, pady=(5, 10))
+        self.window = transcript.canvas.create_window(0, 0, window=self.frame, anchor="nw", state="hidden")
+        self.role = None
+        self.message = None
+        self.segments = None
+        self.rendered = 0
+        self.tail = ""
+        for widget in (self.frame, self.header, self.body):
+            transcript.bind_scroll(widget)
+
+    def show(self, message):
+        """Render `message` into this row; returns False if nothing had to change."""
+        colors = self.transcript.colors
+        restyled = message["role"] != self.role
+        if restyled:
+            header, header_color, body_color, bubble_color = ROLE_STYLES[message["role"]]
+            self.frame.configure(fg_color=colors[bubble_color])
+            self.header.configure(text=header, text_color=colors[header_color])
+            self.body.configure(bg=colors[bubble_color], fg=colors[body_color])
+            self.role = message["role"]
+
+        segments = message["segments"]
+        if message is self.message and segments is self.segments and self.rendered <= len(segments):
+            if self.rendered == len(segments) and message["tail"] == self.tail:
+                return restyled
+            self.body.configure(state="normal")
+            tail = self.body.tag_ranges("tail")
+            if tail:
+                self.body.delete(tail[0], tail[-1])
+            insert_segments(self.body, "end", segments[self.rendered:])
+        else:
+            self.body.configure(state="normal")
+            self.body.delete("1.0", "end")
+            insert_segments(self.body, "end", segments)
+        if message["tail"]:
+            self.body.insert("end", message["tail"], ("tail",))
+        self.body.configure(state="disabled")
+        self.message = message
+        self.segments = segments
+        self.rendered = len(segments)
+        self.tail = message["tail"]
+        return True
+
+    def fit_width(self):
+        """Shrink the body to its longest line so short messages get narrow bubbles."""
+        transcript = self.transcript
+        lines = message_text(self.message).split("\n")
+        if any(len(line) >= transcript.max_chars for line in lines):
+            width = transcript.max_chars
+        else:
+            longest = max(transcript.body_font.measure(line) for line in lines)
+            width = min(longest // transcript.char_width + 2, transcript.max_chars)
+        self.body.configure(width=width)
+
+    def fit_height(self):
+        count = self.body.count("1.0", "end-1c", "update", "displaylines")
+        if isinstance(count, tuple):
+            count = count[-1]
+        self.body.configure(height=(count or 0) + 1)
+
+    def place(self, y, width):
+        canvas = self.transcript.canvas
+        if self.role == "user":
+            canvas.coords(self.window, width, y)
+            canvas.itemconfigure(self.window, anchor="ne", state="normal")
+        else:
+            canvas.coords(self.window, 0, y)
+            canvas.itemconfigure(self.window, anchor="nw", state="normal")
+
+    def hide(self):
+        self.transcript.canvas.itemconfigure(self.window, state="hidden")
+
+
+def message_text(message):
+    return plain_text(message["segments"]) + message["tail"]
+
+
+class VirtualTranscript(ctk.CTkFrame):
+    """Chat transcript that only keeps widgets for the rows on screen.
+
+    Messages live in a plain list with a height per row (estimated until the
+    row has been drawn once, measured afterwards). On every scroll or change
+    the visible range is found by bisecting the row offsets, and a small pool
+    of MessageRow widgets is rebound to it, so widget count and redraw cost do
+    not grow with the length of the conversation.
+    """
+
+    def __init__(self, master, colors, **kwargs):
+        super().__init__(master, fg_color="transparent", corner_radius=0, **kwargs)
+        self.colors = colors
+        self.body_font = tkfont.Font(family="Roboto", size=14)
+        self.char_width = max(self.body_font.measure("0"), 1)
+        self.max_chars = WRAP_LENGTH // self.char_width
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        self.canvas = tk.Canvas(
+            self,
+            bg=colors["bg_dark"],
+            highlightthickness=0,
+            borderwidth=0,
+            yscrollincrement=SCROLL_STEP
+        )
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.bind("<Configure>", lambda e: self.layout_changed())
+        self.bind_scroll(self.canvas)
+
+        self.messages = []
+        self.heights = []
+        self.offsets = []
+        self.first_id = 0
+        self.rows = {}
+        self.free_rows = []
+        self.refresh_job = None
+        self.follow = True
+
+    def bind_scroll(self, widget):
+        widget.bind("<MouseWheel>", self.on_mousewheel, add="+")
+        widget.bind("<Button-4>", lambda e: self.scroll_units(-1), add="+")
+        widget.bind("<Button-5>", lambda e: self.scroll_units(1), add="+")
+
+    def on_mousewheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas.
+        step = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll_units(-step)
+
+    def scroll_units(self, units):
+        self.canvas.yview_scroll(units, "units")
+        self.after_scroll()
+
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.after_scroll()
+
+    def after_scroll(self):
+        self.follow = self.canvas.yview()[1] >= 0.999
+        self.schedule_refresh()
+
+    def estimate_height(self, text):
+        chars_per_line = WRAP_LENGTH // 8
+        lines = sum(max(1, math.ceil(len(line) / chars_per_line)) for line in text.split("\n"))
+        return 45 + lines * 20
+
+    def relayout(self, start):
+        for i in range(max(start, 1), len(self.messages)):
+            self.offsets[i] = self.offsets[i - 1] + self.heights[i - 1] + ROW_SPACING
+
+    def content_height(self):
+        if not self.messages:
+            return 0
+        return self.offsets[-1] + self.heights[-1]
+
+    def append(self, role, text="", segments=None):
+        """Add a message and return an id for later updates."""
+        message = {
+            "role": role,
+            "segments": segments if segments is not None else [(text, ())],
+            "tail": "",
+        }
+        self.offsets.append(self.content_height() + ROW_SPACING if self.messages else 0)
+        self.messages.append(message)
+        self.heights.append(self.estimate_height(message_text(message)))
+        self.layout_changed()
+        return self.first_id + len(self.messages) - 1
+
+    def set_text(self, message_id, text, role=None):
+        self.set_segments(message_id, [(text, ())], role)
+
+    def set_segments(self, message_id, segments, role=None, tail=""):
+        message = self.message(message_id)
+        if message is None:
+            return
+        message["segments"] = segments
+        message["tail"] = tail
+        if role is not None:
+            message["role"] = role
+        self.message_changed(message_id)
+
+    def extend(self, message_id, segments, tail):
+        """Append rendered segments to a message and replace its raw, still-streaming tail."""
+        message = self.message(message_id)
+        if message is None:
+            return
+        message["segments"].extend(segments)
+        message["tail"] = tail
+        self.message_changed(message_id)
+
+    def message(self, message_id):
+        # Ids from before the last clear() no longer point at anything.
+        index = message_id - self.first_id
+        return self.messages[index] if index >= 0 else None
+
+    def message_changed(self, message_id):
+        index = message_id - self.first_id
+        self.heights[index] = self.estimate_height(message_text(self.messages[index]))
+        self.relayout(index + 1)
+        self.layout_changed()
+
+    def clear(self):
+        for row in self.rows.values():
+            row.hide()
+            self.free_rows.append(row)
+        self.rows = {}
+        self.first_id += len(self.messages)
+        self.messages = []
+        self.heights = []
+        self.offsets = []
+        self.follow = True
+        self.layout_changed()
+
+    def scroll_to_bottom(self):
+        self.follow = True
+        self.layout_changed()
+
+    def layout_changed(self):
+        height = max(self.content_height(), self.canvas.winfo_height())
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), height))
+        if self.follow:
+            self.canvas.yview_moveto(1.0)
+        self.schedule_refresh()
+
+    def schedule_refresh(self):
+        if self.refresh_job is None:
+            self.refresh_job = self.after_idle(self.refresh)
+
+    def refresh(self):
+        # Keep the job slot taken while running so update_idletasks() below cannot re-enter.
+        self.refresh_job = "running"
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first = max(bisect.bisect_right(self.offsets, top) - 1 - OVERSCAN, 0)
+        last = min(bisect.bisect_right(self.offsets, bottom) + OVERSCAN, len(self.messages))
+
+        for index in [i for i in self.rows if not first <= i < last]:
+            row = self.rows.pop(index)
+            row.hide()
+            self.free_rows.append(row)
+
+        bound = []
+        for index in range(first, last):
+            row = self.rows.get(index)
+            if row is None:
+                row = self.free_rows.pop() if self.free_rows else MessageRow(self)
+                self.rows[index] = row
+            if row.show(self.messages[index]):
+                bound.append(index)
+                row.fit_width()
+        self.place_rows()
+
+        # Rows whose content changed get their real height: let Tk lay the text out
+        # at its new width, size it to its display lines, then read the bubble height.
+        changed = None
+        if bound:
+            self.canvas.update_idletasks()
+            for index in bound:
+                self.rows[index].fit_height()
+            self.canvas.update_idletasks()
+            for index in bound:
+                height = self.rows[index].frame.winfo_reqheight()
+                if height != self.heights[index]:
+                    self.heights[index] = height
+                    changed = index if changed is None else min(changed, index)
+        if changed is not None:
+            self.relayout(changed + 1)
+            height = max(self.content_height(), self.canvas.winfo_height())
+            self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), height))
+            if self.follow:
+                self.canvas.yview_moveto(1.0)
+            self.place_rows()
+
+        self.refresh_job = None
+        if changed is not None:
+            # Real heights may have moved other rows into view.
+            self.schedule_refresh()
+
+    def place_rows(self):
+        width = self.canvas.winfo_width()
+        for index, row in self.rows.items():
+            row.place(self.offsets[index], width)
@@ -0,0 +1,481 @@
+import gzip
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError, SSLError
+from urllib3.util import make_headers
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+from backends import DiamondBackend, backend_from_env
+from capture import Capture
+from endpoints import EndpointPool, parse_urls
+from metrics import Metrics, TimedAdapter, elapsed_ms, new_sample, take_connect_ms
+from resilience import Resilience, is_retryable
+
+DEFAULT_BASE_URL = "http://172.23.162.4:5000"
+DEFAULT_POOL_SIZE = 10
+# Statuses a proxy or an overloaded node returns without having run the request;
+# 504 is not one of them, as the node may still be generating.
+FAILOVER_STATUSES = {502, 503}
+# urllib3 lists br and zstd only when brotli / zstandard are installed, since it decodes them.
+ACCEPT_ENCODING = make_headers(accept_encoding=True)["accept-encoding"]
+# ijson's pure-Python backends are slower than json.loads; only its C backend is worth using.
+INCREMENTAL_JSON = ijson is not None and ijson.backend == "yajl2_c"
+
+
+class RequestCancelled(requests.exceptions.RequestException):
+    """Every caller waiting for the answer has gone; what arrived so far is not an answer."""
+
+
+def is_stream(response):
+    content_type = response.headers.get("Content-Type", "")
+    return "text/event-stream" in content_type or "ndjson" in content_type
+
+
+def read_stream(response, on_token, handle=None, decode_event=DiamondBackend().decode_event, on_bytes=None):
+    """Consume an SSE or newline-delimited JSON stream of answer tokens.
+
+    `decode_event` maps each JSON event onto {token, metadata, error, done}
+    for the backend that produced it; `on_bytes`, if given, is told the size
+    of every line received.
+    """
+    answer = []
+    metadata = None
+    finished = False
+    for raw in response.iter_lines():
+        if handle is not None and handle.is_cancelled():
+            raise RequestCancelled("Request cancelled")
+        if on_bytes is not None:
+            on_bytes(len(raw) + 1)
+        # Read on to the end of the body rather than breaking out: abandoning the
+        # line iterator closes the socket instead of returning it to the pool.
+        if finished:
+            continue
+        # SSE is always UTF-8, whatever the Content-Type says.
+        line = raw.decode("utf-8")
+        if not line or line.startswith(":") or line.startswith("event:"):
+            continue
+        if line.startswith("data:"):
+            line = line[5:].strip()
+        if line == "[DONE]":
+            finished = True
+            continue
+        event = decode_event(json.loads(line))
+        if event["error"]:
+            return {"error": event["error"]}
+        if event["token"]:
+            answer.append(event["token"])
+            on_token(event["token"])
+        if event["metadata"] is not None:
+            metadata = event["metadata"]
+        if event["done"]:
+            finished = True
+    # Closing the response to cancel can also just end the body early.
+    if handle is not None and handle.is_cancelled():
+        raise RequestCancelled("Request cancelled")
+    return {"answer": "".join(answer), "metadata": metadata}
+
+
+class BodyReader:
+    """File-like view of a response body, decompressed, that reports how much it has read."""
+
+    def __init__(self, response, on_bytes=None):
+        self.raw = response.raw
+        self.on_bytes = on_bytes
+
+    def read(self, size=-1):
+        # Reading response.raw bypasses requests, so its exception mapping is done here
+        # as Response.iter_content does it; callers only have to handle RequestException.
+        try:
+            data = self.raw.read(None if size is None or size < 0 else size, decode_content=True)
+        except ReadTimeoutError as e:
+            raise requests.exceptions.ReadTimeout(e)
+        except ProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e)
+        except DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e)
+        except SSLError as e:
+            raise requests.exceptions.SSLError(e)
+        if self.on_bytes is not None and data:
+            self.on_bytes(len(data))
+        return data
+
+
+def read_json(response, on_bytes=None):
+    """Decode a JSON body, parsing it while it downloads when ijson's C backend is available."""
+    reader = BodyReader(response, on_bytes)
+    if not INCREMENTAL_JSON:
+        return json.loads(reader.read())
+    try:
+        data = next(ijson.items(reader, "", use_float=True))
+    except (ijson.JSONError, StopIteration) as e:
+        raise ValueError(f"Invalid JSON response: {e}") from e
+    # Read whatever follows the value so the connection can be reused.
+    while reader.read(8192):
+        pass
+    return data
+
+
+class Flight:
+    """One /ask call shared by every caller that asked the same question while it ran.
+
+    Streamed tokens are replayed to late joiners and then fanned out to all
+    listeners. A caller leaving (cancelling) only detaches it; the HTTP
+    request itself is aborted once nobody is left waiting.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.tickets = set()
+        self.listeners = {}
+        self.tokens = []
+        self.response = None
+        self.abandoned = False
+        self.finished = False
+        self.result = None
+        self.error = None
+
+    def join(self, on_token=None):
+        """A ticket for this flight, or None if everyone has left it and it is being aborted."""
+        ticket = FlightTicket(self)
+        with self.cond:
+            if self.abandoned:
+                return None
+            self.tickets.add(ticket)
+            if on_token is not None:
+                for token in self.tokens:
+                    on_token(token)
+                self.listeners[ticket] = on_token
+        return ticket
+
+    def leave(self, ticket):
+        with self.cond:
+            ticket.cancelled = True
+            self.tickets.discard(ticket)
+            self.listeners.pop(ticket, None)
+            abandon = not self.tickets and not self.finished
+            if abandon:
+                self.abandoned = True
+            response = self.response
+            self.cond.notify_all()
+        if abandon and response is not None:
+            response.close()
+
+    def attach(self, response):
+        with self.cond:
+            self.response = response
+            abandoned = self.abandoned
+        if abandoned:
+            response.close()
+
+    def is_cancelled(self):
+        return self.abandoned
+
+    def emit(self, token):
+        with self.cond:
+            self.tokens.append(token)
+            for on_token in self.listeners.values():
+                on_token(token)
+
+    def finish(self, result=None, error=None):
+        with self.cond:
+            self.finished = True
+            self.result = result
+            self.error = error
+            self.cond.notify_all()
+
+    def wait(self, ticket):
+        with self.cond:
+            while not self.finished and not ticket.cancelled:
+                self.cond.wait()
+        if ticket.cancelled:
+            return {"error": "Request cancelled"}
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class FlightTicket:
+    """A caller's place in a Flight; closing it is how a RequestHandle cancels."""
+
+    def __init__(self, flight):
+        self.flight = flight
+        self.cancelled = False
+
+    def close(self):
+        self.flight.leave(self)
+
+
+class Transport:
+    """Keep-alive HTTP session shared by everything a client sends to the LLM server.
+
+    What goes over the wire for a question is up to `backend` (see backends.py).
+    `base_url` may list several servers, comma-separated; questions are then
+    spread over them and fail over from a node that is down (see endpoints.py).
+    With `coalesce` off, identical questions in flight together are each sent
+    on their own, as a load generator needs.
+    """
+
+    def __init__(
+        self,
+        base_url=DEFAULT_BASE_URL,
+        connect_timeout=5,
+        read_timeout=30,
+        health_timeout=5,
+        pool_size=DEFAULT_POOL_SIZE,
+        compress_over=None,
+        backend=None,
+        resilience=None,
+        metrics=None,
+        capture=None,
+        coalesce=True,
+    ):
+        urls = parse_urls(base_url)
+        # Names the whole deployment, e.g. for cache keys; single servers keep their plain URL.
+        self.base_url = ",".join(urls)
+        self.pool = EndpointPool(urls)
+        self.backend = backend or DiamondBackend()
+        self.resilience = resilience or Resilience()
+        self.metrics = metrics or Metrics()
+        self.capture = capture
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.health_timeout = health_timeout
+        self.compress_over = compress_over
+
+        self.coalesce = coalesce
+        self.flights = {}
+        self.flights_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = TimedAdapter(pool_connections=len(urls), pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        self.session.headers.update(self.backend.headers())
+
+    @classmethod
+    def from_env(cls, default_url=DEFAULT_BASE_URL, base_url=None, **kwargs):
+        """Build a transport, letting LLM_* environment variables override the defaults.
+
+        `base_url` (e.g. from a command-line flag) wins over LLM_SERVER_URL;
+        everything else is still taken from the environment.
+        """
+        env = os.environ
+        base_url = base_url or env.get("LLM_SERVER_URL", default_url)
+        if "LLM_CONNECT_TIMEOUT" in env:
+            kwargs["connect_timeout"] = float(env["LLM_CONNECT_TIMEOUT"])
+        if "LLM_READ_TIMEOUT" in env:
+            kwargs["read_timeout"] = float(env["LLM_READ_TIMEOUT"])
+        if "LLM_HEALTH_TIMEOUT" in env:
+            kwargs["health_timeout"] = float(env["LLM_HEALTH_TIMEOUT"])
+        if "LLM_POOL_SIZE" in env:
+            kwargs["pool_size"] = int(env["LLM_POOL_SIZE"])
+        if env.get("LLM_COMPRESS_REQUESTS_OVER"):
+            kwargs["compress_over"] = int(env["LLM_COMPRESS_REQUESTS_OVER"])
+        kwargs.setdefault("backend", backend_from_env())
+        kwargs.setdefault("resilience", Resilience.from_env())
+        kwargs.setdefault("metrics", Metrics.from_env())
+        kwargs.setdefault("capture", Capture.from_env())
+        return cls(base_url, **kwargs)
+
+    def url(self, path, endpoint=None):
+        base = (endpoint or self.pool.endpoints[0]).url
+        return f"{base}/{path.lstrip('/')}"
+
+    def get(self, path, read_timeout=None, endpoint=None, **kwargs):
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        return self.session.get(self.url(path, endpoint), timeout=timeout, **kwargs)
+
+    def post(self, path, read_timeout=None, endpoint=None, **kwargs):
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        return self.session.post(self.url(path, endpoint), timeout=timeout, **kwargs)
+
+    def ask(self, question, on_token=None, handle=None, history=None):
+        """Ask the server a question and return {"answer", "metadata"} or {"error"}.
+
+        With on_token, the server is asked to stream and each token is passed
+        on as it arrives; servers that answer with plain JSON still work.
+        `history` holds earlier turns of the conversation as chat messages.
+        Identical questions (with identical history) asked while one is
+        already in flight share that request instead of sending another.
+        """
+        key = (question, json.dumps(history)) if history else question
+        while self.coalesce:
+            with self.flights_lock:
+                flight = self.flights.get(key)
+                # A flight everyone has left is being aborted; it cannot answer anyone else.
+                leader = flight is None or flight.abandoned
+                if leader:
+                    flight = self.flights[key] = Flight()
+            ticket = flight.join(on_token)
+            if ticket is not None:
+                break
+        else:
+            # Unregistered, so nobody else can join it.
+            leader = True
+            flight = Flight()
+            ticket = flight.join(on_token)
+        if handle is not None:
+            handle.attach(ticket)
+
+        if leader:
+            try:
+                result = self.request_answer(question, flight, on_token is not None, history)
+            except Exception as e:
+                self.land(key, flight, error=e)
+            else:
+                self.land(key, flight, result=result)
+        return flight.wait(ticket)
+
+    def land(self, key, flight, result=None, error=None):
+        with self.flights_lock:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+        flight.finish(result, error)
+
+    def request_answer(self, question, flight, stream, history=None):
+        path, payload = self.backend.request(question, stream, history)
+        sample = new_sample("ask")
+        try:
+            # Generation is not repeated once a server may have started it, and never
+            # after tokens have been passed on, since they cannot be taken back.
+            result = self.resilience.call(
+                lambda: self.request_any(path, payload, flight, stream, sample),
+                idempotent=False,
+                retryable=lambda e: not flight.tokens,
+                cancelled=flight.is_cancelled,
+            )
+        except Exception as e:
+            self.metrics.finish(sample, error="cancelled" if flight.is_cancelled() else e)
+            if self.capture is not None:
+                self.capture.record(question, history, stream, sample)
+            raise
+        self.metrics.finish(sample, error=result.get("error"))
+        if self.capture is not None:
+            self.capture.record(question, history, stream, sample, result)
+        return result
+
+    def request_any(self, path, payload, flight, stream, sample):
+        """Send the request to the best endpoint, moving on to the next if one is unreachable."""
+        tried = []
+        while True:
+            endpoint = self.pool.acquire(exclude=tried)
+            tried.append(endpoint)
+            try:
+                return self.request_from(endpoint, path, payload, flight, stream, sample)
+            except (requests.exceptions.ConnectionError, requests.exceptions.HTTPError) as e:
+                if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code not in FAILOVER_STATUSES:
+                    raise
+                if flight.is_cancelled():
+                    raise
+                self.pool.record_failure(endpoint)
+                # /ask is not idempotent: only a request that cannot have run moves on to another node.
+                if not is_retryable(e, idempotent=False) or flight.tokens or len(tried) == len(self.pool):
+                    raise
+            finally:
+                self.pool.release(endpoint)
+
+    def request_from(self, endpoint, path, payload, flight, stream, sample):
+        sample["attempts"] += 1
+        sample["endpoint"] = endpoint.url
+        take_connect_ms()
+        body, headers = self.encode_body(payload)
+        try:
+            # Always streamed, so plain JSON replies can be decoded as they arrive too.
+            with self.post(path, endpoint=endpoint, data=body, headers=headers, stream=True) as response:
+                self.measure(sample, response)
+                flight.attach(response)
+                response.raise_for_status()
+                self.pool.record_success(endpoint, response.elapsed.total_seconds())
+                sample["response_bytes"] = 0
+                sample["encoding"] = response.headers.get("Content-Encoding")
+
+                def count(size):
+                    sample["response_bytes"] += size
+
+                if is_stream(response):
+
+                    def emit(token):
+                        if sample["ttft_ms"] is None:
+                            sample["ttft_ms"] = elapsed_ms(sample)
+                        flight.emit(token)
+
+                    return read_stream(response, emit, flight, self.backend.decode_event, count)
+                data = read_json(response, count)
+                if flight.is_cancelled():
+                    raise RequestCancelled("Request cancelled")
+                sample["wire_bytes"] = response.raw.tell() or None
+                return self.backend.decode(data)
+        finally:
+            sample["connect_ms"] += take_connect_ms()
+
+    def encode_body(self, payload):
+        """Serialize a JSON payload, gzipping it when it is over `compress_over` bytes."""
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.compress_over is not None and len(body) > self.compress_over:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        return body, headers
+
+    def measure(self, sample, response):
+        sample["status"] = response.status_code
+        sample["ttfb_ms"] = response.elapsed.total_seconds() * 1000
+        sample["request_bytes"] = len(response.request.body or b"")
+
+    def probe(self, endpoint):
+        sample = new_sample("health")
+        sample["attempts"] = 1
+        sample["endpoint"] = endpoint.url
+        take_connect_ms()
+        try:
+            response = self.get(self.backend.health_path, read_timeout=self.health_timeout, endpoint=endpoint)
+            self.measure(sample, response)
+            sample["response_bytes"] = len(response.content)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            self.pool.record_failure(endpoint)
+            sample["connect_ms"] += take_connect_ms()
+            self.metrics.finish(sample, error=e)
+            raise
+        self.pool.record_success(endpoint)
+        sample["connect_ms"] += take_connect_ms()
+        self.metrics.finish(sample)
+        return response
+
+    def health(self):
+        """Probe every endpoint; return a healthy one's response, or raise if none is up.
+
+        Probes bypass the circuit breaker, and a successful one closes it.
+        """
+        response = self.probe_all()
+        self.resilience.breaker.record_success()
+        return response
+
+    def probe_all(self):
+        endpoints = self.pool.endpoints
+        if len(endpoints) == 1:
+            return self.probe(endpoints[0])
+        with ThreadPoolExecutor(max_workers=len(endpoints)) as executor:
+            futures = [executor.submit(self.probe, endpoint) for endpoint in endpoints]
+        error = None
+        for future in futures:
+            try:
+                return future.result()
+            except requests.exceptions.RequestException as e:
+                error = e
+        raise error
+
+    def close(self):
+        self.session.close()
+        self.metrics.close()
+        if self.capture is not None:
+            self.capture.close()
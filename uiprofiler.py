@@ -0,0 +1,243 @@
+import json
+import os
+import sys
+import threading
+import time
+import tkinter as tk
+import traceback
+from collections import deque
+from datetime import datetime
+
+INTERVAL_MS = 50
+THRESHOLD_MS = 200
+# A minute of heartbeats at the default interval.
+LAG_WINDOW = 1200
+MAX_STALLS = 50
+STACK_LIMIT = 25
+PANEL_REFRESH_MS = 1000
+
+# Every Tcl-to-Python callback (bind, command, after) goes through CallWrapper.__call__.
+original_call = tk.CallWrapper.__call__
+active = None
+
+
+def handler_name(func):
+    """A readable name for a Tk callback, looking through after()'s wrapper function."""
+    code = getattr(func, "__code__", None)
+    if code is not None and func.__qualname__.endswith("after.<locals>.callit") and "func" in code.co_freevars:
+        func = func.__closure__[code.co_freevars.index("func")].cell_contents
+    return getattr(func, "__qualname__", None) or type(func).__qualname__
+
+
+def timed(name, func, *args):
+    """Call func(*args), counting its time under `name` if a profiler is running."""
+    profiler = active
+    if profiler is None:
+        return func(*args)
+    previous = profiler.current
+    profiler.current = name
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        profiler.current = previous
+        profiler.record_handler(name, (time.perf_counter() - start) * 1000)
+
+
+def timed_call(wrapper, *args):
+    if active is None:
+        return original_call(wrapper, *args)
+    return timed(handler_name(wrapper.func), original_call, wrapper, *args)
+
+
+class UIProfiler:
+    """Watches how responsive the Tk main loop is and what keeps it busy.
+
+    A heartbeat scheduled with after() every `interval_ms` measures how late
+    it runs; lag beyond `threshold_ms` is a stall. While a stall is still
+    going on, a watchdog thread takes the main thread's stack, so the record
+    shows the code that blocked the loop, not just that it was blocked. Every
+    Tk callback is timed per handler as well. show_panel() opens a live view;
+    dump() writes everything to a JSON file.
+    """
+
+    def __init__(self, root, interval_ms=INTERVAL_MS, threshold_ms=THRESHOLD_MS, path="ui_profile.json"):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.threshold_ms = threshold_ms
+        self.path = path
+        self.lock = threading.Lock()
+        self.lags = deque(maxlen=LAG_WINDOW)
+        self.stalls = deque(maxlen=MAX_STALLS)
+        self.handlers = {}
+        self.current = None
+        self.stack = None
+        self.panel = None
+        self.main_thread = threading.main_thread().ident
+        self.due = time.perf_counter() + interval_ms / 1000
+        self.stopped = threading.Event()
+        self.watchdog = threading.Thread(target=self.watch, daemon=True)
+
+    @classmethod
+    def from_env(cls, root):
+        """A started profiler if LLM_UI_PROFILE is set, else None."""
+        env = os.environ
+        if env.get("LLM_UI_PROFILE", "").lower() not in ("1", "true", "yes", "on"):
+            return None
+        profiler = cls(
+            root,
+            threshold_ms=float(env.get("LLM_UI_STALL_MS", THRESHOLD_MS)),
+            path=env.get("LLM_UI_PROFILE_FILE", "ui_profile.json"),
+        )
+        profiler.start()
+        return profiler
+
+    def start(self):
+        global active
+        active = self
+        tk.CallWrapper.__call__ = timed_call
+        self.due = time.perf_counter() + self.interval_ms / 1000
+        self.root.after(self.interval_ms, self.tick)
+        self.watchdog.start()
+
+    def stop(self):
+        global active
+        active = None
+        tk.CallWrapper.__call__ = original_call
+        self.stopped.set()
+
+    def tick(self):
+        if self.stopped.is_set():
+            return
+        now = time.perf_counter()
+        lag_ms = (now - self.due) * 1000
+        with self.lock:
+            self.lags.append(lag_ms)
+            if lag_ms >= self.threshold_ms:
+                self.stalls.append({
+                    "time": datetime.now().isoformat(timespec="milliseconds"),
+                    "lag_ms": round(lag_ms, 1),
+                    "handler": self.stack["handler"] if self.stack else None,
+                    "stack": self.stack["lines"] if self.stack else [],
+                })
+            self.stack = None
+        self.due = now + self.interval_ms / 1000
+        self.root.after(self.interval_ms, self.tick)
+
+    def watch(self):
+        # Checked at half the threshold, so a stall is caught while it lasts.
+        while not self.stopped.wait(self.threshold_ms / 2000):
+            due = self.due
+            if (time.perf_counter() - due) * 1000 < self.threshold_ms / 2 or self.stack is not None:
+                continue
+            frame = sys._current_frames().get(self.main_thread)
+            if frame is None:
+                continue
+            lines = traceback.format_stack(frame, limit=STACK_LIMIT)
+            with self.lock:
+                # Keep it only if the heartbeat has not caught up in the meantime.
+                if self.due == due:
+                    self.stack = {"handler": self.current, "lines": lines}
+
+    def record_handler(self, name, elapsed_ms):
+        with self.lock:
+            stats = self.handlers.get(name)
+            if stats is None:
+                stats = self.handlers[name] = {"calls": 0, "total_ms": 0.0, "max_ms": 0.0}
+            stats["calls"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def reset(self):
+        with self.lock:
+            self.lags.clear()
+            self.stalls.clear()
+            self.handlers = {}
+
+    def snapshot(self):
+        # metrics pulls in requests, which the clients import only after startup.
+        from metrics import percentile
+
+        with self.lock:
+            lags = sorted(self.lags)
+            stalls = list(self.stalls)
+            handlers = {name: dict(stats) for name, stats in self.handlers.items()}
+        return {
+            "generated": datetime.now().isoformat(timespec="seconds"),
+            "interval_ms": self.interval_ms,
+            "threshold_ms": self.threshold_ms,
+            "lag_ms": {
+                "p50": percentile(lags, 0.5),
+                "p95": percentile(lags, 0.95),
+                "p99": percentile(lags, 0.99),
+                "max": lags[-1] if lags else None,
+            },
+            "stalls": stalls,
+            "handlers": dict(sorted(handlers.items(), key=lambda item: item[1]["total_ms"], reverse=True)),
+        }
+
+    def dump(self, path=None):
+        path = path or self.path
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        return path
+
+    def report(self):
+        """The snapshot as text for the debug panel."""
+        data = self.snapshot()
+        lag = data["lag_ms"]
+        lines = ["Main loop lag (last minute)"]
+        if lag["p50"] is None:
+            lines.append("  no samples yet")
+        else:
+            lines.append(
+                f"  p50 {lag['p50']:.0f} ms · p95 {lag['p95']:.0f} ms · p99 {lag['p99']:.0f} ms · max {lag['max']:.0f} ms"
+            )
+        lines += ["", f"Stalls over {self.threshold_ms:.0f} ms ({len(data['stalls'])})"]
+        for stall in reversed(data["stalls"][-10:]):
+            lines.append(f"  {stall['time']}  {stall['lag_ms']:.0f} ms  in {stall['handler'] or '?'}")
+            # The innermost frames are the ones that were blocking.
+            for frame in stall["stack"][-4:]:
+                lines.append("      " + frame.strip().splitlines()[0])
+        lines += ["", f"{'handler':<60} {'calls':>7} {'total ms':>10} {'max ms':>8}"]
+        for name, stats in list(data["handlers"].items())[:25]:
+            lines.append(f"{name[-60:]:<60} {stats['calls']:>7} {stats['total_ms']:>10.1f} {stats['max_ms']:>8.1f}")
+        return "\n".join(lines)
+
+    def show_panel(self, event=None):
+        if self.panel is not None and self.panel.winfo_exists():
+            self.panel.lift()
+            return
+        self.panel = ProfilerPanel(self.root, self)
+
+
+class ProfilerPanel(tk.Toplevel):
+    """Live view of a UIProfiler, refreshed every second while open."""
+
+    def __init__(self, root, profiler):
+        super().__init__(root)
+        self.profiler = profiler
+        self.title("UI responsiveness")
+        self.geometry("900x600")
+
+        buttons = tk.Frame(self)
+        buttons.pack(fill="x")
+        tk.Button(buttons, text="Dump to file", command=self.dump).pack(side="left", padx=5, pady=5)
+        tk.Button(buttons, text="Reset", command=profiler.reset).pack(side="left", pady=5)
+        self.status = tk.Label(buttons, anchor="w")
+        self.status.pack(side="left", fill="x", expand=True, padx=10)
+
+        self.text = tk.Text(self, font=("Courier", 10), wrap="none")
+        self.text.pack(fill="both", expand=True)
+        self.refresh()
+
+    def refresh(self):
+        if not self.winfo_exists():
+            return
+        self.text.delete("1.0", "end")
+        self.text.insert("1.0", self.profiler.report())
+        self.after(PANEL_REFRESH_MS, self.refresh)
+
+    def dump(self):
+        path = self.profiler.dump()
+        self.status.configure(text=f"Written to {os.path.abspath(path)}")